@@ -3,3 +3,12 @@ from django.apps import AppConfig
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        from . import authentication  # noqa: F401
+        from . import caching  # noqa: F401
+        from . import checks  # noqa: F401
+        from . import feed  # noqa: F401
+        from . import images  # noqa: F401
+        from . import recipe_search  # noqa: F401
+        from . import shopping_list  # noqa: F401
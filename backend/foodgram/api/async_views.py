@@ -0,0 +1,72 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.urls import URLPattern, URLResolver
+from rest_framework.permissions import SAFE_METHODS
+
+from .databases import check_connections, release_pooled_connections
+from .views import IngredientsViewSet, RecipeViewSet, TagsViewSet
+
+ASYNC_VIEWSETS = (TagsViewSet, IngredientsViewSet, RecipeViewSet)
+ASYNC_ACTIONS = ('list', 'retrieve')
+
+
+def run_view(view, request, *args, **kwargs):
+    """Выполняет представление в потоке из общего пула.
+
+    Сигналы начала и конца запроса закрывают соединения только в потоке
+    запроса, поэтому здесь то же делается для потока пула.
+    """
+    close_old_connections()
+    check_connections()
+    try:
+        return view(request, *args, **kwargs)
+    finally:
+        release_pooled_connections()
+        close_old_connections()
+
+
+def offload(view):
+    """Асинхронный вариант представления DRF.
+
+    Чтение выполняется в общем пуле потоков, размер которого задает
+    ASGI_THREADS: его потоки живут между запросами и переиспользуют
+    соединения с базой. Остальные методы и запросы под профилировщиком,
+    который следит за соединениями потока запроса, идут туда же, куда
+    Django отправляет синхронные представления.
+    """
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        if (request.method in SAFE_METHODS
+                and not hasattr(request, 'profile')):
+            return await sync_to_async(run_view, thread_sensitive=False)(
+                view, request, *args, **kwargs
+            )
+        return await sync_to_async(view)(request, *args, **kwargs)
+
+    return async_view
+
+
+def is_offloaded(callback):
+    actions = getattr(callback, 'actions', None) or {}
+    return (getattr(callback, 'cls', None) in ASYNC_VIEWSETS
+            and actions.get('get') in ASYNC_ACTIONS)
+
+
+def offload_read_views(patterns):
+    """Копия patterns, где list и retrieve из ASYNC_VIEWSETS асинхронные."""
+    result = []
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            pattern = URLResolver(
+                pattern.pattern, offload_read_views(pattern.url_patterns),
+                pattern.default_kwargs, pattern.app_name, pattern.namespace
+            )
+        elif is_offloaded(pattern.callback):
+            pattern = URLPattern(
+                pattern.pattern, offload(pattern.callback),
+                pattern.default_args, pattern.name
+            )
+        result.append(pattern)
+    return result
@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from django.db.models import DEFERRED
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+from .caching import is_cache_shared
+
+CACHED_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname != 'password'
+)
+
+
+def get_token_key(key):
+    return f'token:{key}'
+
+
+def load_user(values):
+    return User.from_db(
+        router.db_for_read(User),
+        [field.attname for field in User._meta.concrete_fields],
+        [values.get(field.attname, DEFERRED)
+         for field in User._meta.concrete_fields],
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Токен-аутентификация, которая не ходит в базу на каждый запрос.
+
+    С кешем, локальным для процесса, удаленный токен продолжал бы
+    работать в остальных воркерах, поэтому тогда кеш не используется.
+    """
+
+    def authenticate_credentials(self, key):
+        if not is_cache_shared():
+            return super().authenticate_credentials(key)
+        values = cache.get(get_token_key(key))
+        if values is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(
+                get_token_key(key),
+                {name: getattr(user, name) for name in CACHED_FIELDS},
+                settings.AUTH_TOKEN_CACHE_TIMEOUT,
+            )
+            return user, token
+        user = load_user(values)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        return user, Token(key=key, user=user)
+
+
+@receiver(post_delete, sender=Token)
+def forget_token(sender, instance, **kwargs):
+    cache.delete(get_token_key(instance.key))
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(sender, instance, created, **kwargs):
+    if created:
+        return
+    cache.delete_many([
+        get_token_key(key) for key in
+        Token.objects.filter(user=instance).values_list('key', flat=True)
+    ])
@@ -0,0 +1,106 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from recipes.models import Ingredient, Tag
+from users.models import User
+
+from .databases import use_primary
+from .renderers import FastJSONRenderer
+
+VERSIONED_MODELS = {
+    Tag: 'tags',
+    Ingredient: 'ingredients',
+}
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+
+def is_cache_shared():
+    return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES
+
+
+def new_version():
+    """Начальное значение версии, которое не повторяется.
+
+    Ключ версии может пропасть: его вытеснит кеш или он не переживет
+    перезапуск. Если бы счетчик снова начинался с 1, под ним нашлись бы
+    старые данные, закешированные с той же версией.
+    """
+    return time.time_ns()
+
+
+def get_version(prefix):
+    return get_versions(prefix)[0]
+
+
+def get_versions(*prefixes):
+    keys = [f'{prefix}:version' for prefix in prefixes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = new_version()
+            cache.add(key, version, None)
+            versions[key] = cache.get(key, version)
+    return [versions[key] for key in keys]
+
+
+def bump_version(prefix):
+    try:
+        cache.incr(f'{prefix}:version')
+    except ValueError:
+        cache.add(f'{prefix}:version', new_version(), None)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate(sender, **kwargs):
+    bump_version(VERSIONED_MODELS[sender])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user(sender, instance, **kwargs):
+    bump_version(f'users:{instance.pk}')
+
+
+def is_not_modified(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    return header.strip() == '*' or etag in parse_etags(header)
+
+
+def cached_response(request, etag, content):
+    if is_not_modified(request, etag):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+class CachedListMixin:
+    cache_prefix = None
+
+    def list(self, request, *args, **kwargs):
+        key = f'{self.cache_prefix}:list:{get_version(self.cache_prefix)}'
+        cached = cache.get(key)
+        if cached is None:
+            # Общий кеш живет до следующей смены версии, поэтому
+            # заполняем его с основной базы, а не с отстающей реплики.
+            with use_primary():
+                data = super().list(request, *args, **kwargs).data
+            content = FastJSONRenderer().render(data)
+            cached = (f'"{hashlib.md5(content).hexdigest()}"', content)
+            cache.set(key, cached, settings.REFERENCE_CACHE_TIMEOUT)
+        return cached_response(request, *cached)
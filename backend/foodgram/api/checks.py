@@ -0,0 +1,32 @@
+import os
+
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+from .caching import is_cache_shared
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    if is_cache_shared():
+        return []
+    return [Warning(
+        'Кеш по умолчанию локален для процесса: сброс версий кешей и '
+        'токенов не дойдет до других воркеров и run_worker.',
+        hint='Задайте CACHE_BACKEND с общим хранилищем, например '
+             'FileBasedCache или MemcachedCache.',
+        id='api.W001',
+    )]
+
+
+@register()
+def check_pdf_font(app_configs, **kwargs):
+    font_path = settings.SHOPPING_LIST_PDF_FONT
+    if font_path and os.path.isfile(font_path):
+        return []
+    return [Error(
+        f'Не найден шрифт для PDF со списком покупок: {font_path!r}.',
+        hint='Установите fonts-dejavu-core или задайте '
+             'SHOPPING_LIST_PDF_FONT с путем к TTF-файлу с кириллицей.',
+        id='api.E001',
+    )]
@@ -0,0 +1,110 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.permissions import SAFE_METHODS
+
+replica_alias = ContextVar('replica_alias', default=None)
+
+
+def get_pin_key(user_id):
+    return f'primary-pin:{user_id}'
+
+
+def is_pinned(user):
+    return user.is_authenticated and cache.get(get_pin_key(user.pk), False)
+
+
+def pin_to_primary(user):
+    if user is not None and user.is_authenticated:
+        cache.set(get_pin_key(user.pk), True, settings.REPLICA_PIN_TIMEOUT)
+
+
+@contextmanager
+def use_primary():
+    token = replica_alias.set(None)
+    try:
+        yield
+    finally:
+        replica_alias.reset(token)
+
+
+def check_connections():
+    for connection in connections.all():
+        if (connection.connection is not None
+                and connection.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not connection.is_usable()):
+            connection.close()
+
+
+def release_pooled_connections():
+    for connection in connections.all():
+        if (getattr(connection, 'pooled', False)
+                and not connection.in_atomic_block):
+            connection.close()
+
+
+class ReplicaRouter:
+    """Читает с реплики, только если это разрешил текущий запрос."""
+
+    def get_databases(self):
+        return {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+
+    def db_for_read(self, model, **hints):
+        return replica_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = self.get_databases()
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class DatabaseMiddleware(MiddlewareMixin):
+    """Проверяет соединения до запроса и возвращает их в пул после.
+
+    Под ASGI Django вызывает эти методы в потоке запроса, где работают
+    и синхронные представления, поэтому middleware обслуживает именно
+    те соединения, которыми пользовался запрос. Представления из
+    async_views следят за соединениями своего потока сами.
+    """
+
+    def process_request(self, request):
+        check_connections()
+
+    def process_response(self, request, response):
+        release_pooled_connections()
+        if (settings.DATABASE_REPLICAS
+                and request.method not in SAFE_METHODS
+                and response.status_code < 400):
+            pin_to_primary(getattr(request, 'user', None))
+        return response
+
+
+class ReplicaReadMixin:
+    """Отправляет безопасные запросы из replica_actions на реплику.
+
+    Пользователь, который недавно что-то менял, читает с основной базы,
+    пока не истечет REPLICA_PIN_TIMEOUT.
+    """
+
+    replica_actions = ('list', 'retrieve')
+
+    def dispatch(self, request, *args, **kwargs):
+        with use_primary():
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (settings.DATABASE_REPLICAS
+                and request.method in SAFE_METHODS
+                and self.action in self.replica_actions
+                and not is_pinned(request.user)):
+            replica_alias.set(random.choice(settings.DATABASE_REPLICAS))
@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.db import transaction
+from recipes.models import FeedEntry, Recipe
+from tasks.process import register
+from users.models import Follow
+
+
+def add_entries(entries):
+    FeedEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+@register
+def fan_out(recipe_id):
+    recipe = Recipe.objects.filter(pk=recipe_id).values(
+        'id', 'author_id'
+    ).first()
+    if recipe is None:
+        return
+    followers = Follow.objects.filter(
+        author_id=recipe['author_id']
+    ).order_by('user_id').values_list('user_id', flat=True)
+    last = 0
+    while True:
+        # Пачка вставляется под блокировкой строк Follow: отписка ждет
+        # ее коммита, и prune удаляет уже вставленные записи, а после
+        # отписки подписчика в выборке уже нет.
+        with transaction.atomic():
+            batch = list(
+                followers.select_for_update().filter(
+                    user_id__gt=last
+                )[:settings.FEED_BATCH_SIZE]
+            )
+            if not batch:
+                return
+            add_entries([
+                FeedEntry(user_id=user_id, recipe_id=recipe['id'],
+                          author_id=recipe['author_id'])
+                for user_id in batch
+            ])
+        last = batch[-1]
+
+
+@register
+def backfill(user_id, author_id):
+    recipes = Recipe.objects.filter(
+        author_id=author_id
+    ).order_by('-id').values_list('id', flat=True)
+    # Как и в fan_out, каждая пачка держит блокировку строки Follow, чтобы
+    # отписка с prune не разминулась со вставкой.
+    follow = Follow.objects.select_for_update().filter(
+        user_id=user_id, author_id=author_id
+    )
+    last = None
+    while True:
+        with transaction.atomic():
+            if not follow.exists():
+                return
+            batch = recipes if last is None else recipes.filter(id__lt=last)
+            batch = list(batch[:settings.FEED_BATCH_SIZE])
+            if not batch:
+                return
+            add_entries([
+                FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                          author_id=author_id)
+                for recipe_id in batch
+            ])
+        last = batch[-1]
+
+
+def prune(user_id, author_id):
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
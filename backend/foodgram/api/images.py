@@ -0,0 +1,82 @@
+import base64
+import binascii
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.utils import timezone
+from PIL import Image, UnidentifiedImageError
+from recipes.models import Recipe
+from rest_framework import serializers
+from tasks.process import register
+
+CHUNK_SIZE = 64 * 1024
+FORMATS = {
+    'png': 'image/png',
+    'jpeg': 'image/jpeg',
+    'jpg': 'image/jpeg',
+    'gif': 'image/gif',
+    'webp': 'image/webp',
+}
+
+
+def decode_base64_image(data, name):
+    header, _, payload = data.partition(';base64,')
+    # Клиенты переносят длинный base64 по строкам; до декодирования
+    # по кускам пробелы убираем, иначе сместятся границы четверок.
+    payload = ''.join(payload.split())
+    extension = header.split('/')[-1].lower()
+    if extension not in FORMATS or not payload:
+        raise serializers.ValidationError('Неподдерживаемый формат.')
+    if len(payload) * 3 // 4 > settings.IMAGE_UPLOAD_MAX_SIZE:
+        raise serializers.ValidationError('Слишком большой файл.')
+    file = TemporaryUploadedFile(
+        f'{name}.{extension}', FORMATS[extension], 0, None
+    )
+    try:
+        for start in range(0, len(payload), CHUNK_SIZE):
+            file.write(base64.b64decode(
+                payload[start:start + CHUNK_SIZE], validate=True
+            ))
+        file.size = file.tell()
+        file.seek(0)
+        with Image.open(file) as image:
+            width, height = image.size
+            if width * height > settings.IMAGE_MAX_PIXELS:
+                raise serializers.ValidationError(
+                    'Слишком большое разрешение.'
+                )
+            image.verify()
+    except (binascii.Error, UnidentifiedImageError, SyntaxError, OSError):
+        file.close()
+        raise serializers.ValidationError('Некорректное изображение.')
+    except serializers.ValidationError:
+        file.close()
+        raise
+    file.seek(0)
+    return file
+
+
+@register
+def generate_variants(recipe_id):
+    recipe = Recipe.objects.only('image').get(pk=recipe_id)
+    name = recipe.image.name
+    fields = {}
+    with recipe.image.open('rb'), Image.open(recipe.image) as image:
+        image.draft('RGB', max(settings.IMAGE_VARIANTS.values()))
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        for variant, size in settings.IMAGE_VARIANTS.items():
+            thumbnail = image.copy()
+            thumbnail.thumbnail(size)
+            buffer = BytesIO()
+            thumbnail.save(buffer, 'WEBP', quality=80)
+            field = Recipe._meta.get_field(f'image_{variant}')
+            fields[field.name] = field.storage.save(
+                field.generate_filename(recipe, f'{variant}.webp'),
+                ContentFile(buffer.getvalue()),
+            )
+    Recipe.objects.filter(pk=recipe_id, image=name).update(
+        updated_at=timezone.now(), **fields
+    )
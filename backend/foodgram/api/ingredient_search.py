@@ -0,0 +1,67 @@
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db.models import Case, IntegerField, Q, Value, When
+from recipes.models import Ingredient
+
+from .caching import get_version
+from .databases import use_primary
+
+
+class IngredientIndex:
+    def __init__(self):
+        self.data = (None, [], [])
+
+    def build(self, version):
+        rows = sorted(
+            Ingredient.objects.values('id', 'name', 'measurement_unit'),
+            key=lambda row: (row['name'].lower(), row['id'])
+        )
+        self.data = (version, [row['name'].lower() for row in rows], rows)
+
+    def search(self, name, limit):
+        version = get_version('ingredients')
+        if version != self.data[0]:
+            # Индекс живет до следующей смены версии, поэтому строим
+            # его с основной базы, а не с отстающей реплики.
+            with use_primary():
+                self.build(version)
+        _, keys, rows = self.data
+        name = name.lower()
+        found = []
+        position = bisect_left(keys, name)
+        while (position < len(keys) and len(found) < limit
+               and keys[position].startswith(name)):
+            found.append(rows[position])
+            position += 1
+        if len(found) < limit:
+            for key, row in zip(keys, rows):
+                if name in key and not key.startswith(name):
+                    found.append(row)
+                    if len(found) >= limit:
+                        break
+        return found
+
+
+index = IngredientIndex()
+
+
+def search_in_database(name, limit):
+    return list(
+        Ingredient.objects.filter(
+            Q(name__istartswith=name) | Q(name__icontains=name)
+        ).annotate(rank=Case(
+            When(name__istartswith=name, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField(),
+        )).order_by('rank', 'name').values(
+            'id', 'name', 'measurement_unit'
+        )[:limit]
+    )
+
+
+def search_ingredients(name):
+    limit = settings.INGREDIENT_SEARCH_LIMIT
+    if settings.INGREDIENT_SEARCH_BACKEND == 'database':
+        return search_in_database(name, limit)
+    return index.search(name, limit)
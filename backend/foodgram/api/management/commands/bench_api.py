@@ -0,0 +1,121 @@
+import json
+import os
+import statistics
+import subprocess
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from recipes.models import Ingredient, Recipe
+from rest_framework.test import APIClient
+from users.models import User
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = max(0, round(percent / 100 * len(values) + 0.5) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+def get_revision():
+    try:
+        return subprocess.check_output(
+            ('git', 'rev-parse', 'HEAD'), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_request(client, url):
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        response = client.get(url)
+        if response.streaming:
+            size = sum(len(chunk) for chunk in response.streaming_content)
+        else:
+            size = len(response.content)
+        elapsed = (time.perf_counter() - started) * 1000
+    if response.status_code != 200:
+        raise CommandError(f'{url}: статус {response.status_code}')
+    return elapsed, len(queries), size
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержки и число SQL-запросов основных эндпоинтов API '
+            'и сохраняет отчет в JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--user', help='Имя пользователя для запросов.')
+        parser.add_argument(
+            '--output',
+            default=os.path.join(settings.BENCH_REPORTS_DIR, 'bench_api.json'),
+            help='Куда сохранить отчет.'
+        )
+
+    def get_user(self, username):
+        if username:
+            return User.objects.get(username=username)
+        user = User.objects.annotate(
+            carts=Count('shopping_carts')
+        ).order_by('-carts', 'id').first()
+        if user is None:
+            raise CommandError('Нет пользователей: запустите seed_bench.')
+        return user
+
+    def get_endpoints(self):
+        name = Ingredient.objects.values_list('name', flat=True).first()
+        query = (name or 'а')[:3]
+        return (
+            '/api/recipes/',
+            '/api/users/subscriptions/',
+            '/api/recipes/download_shopping_cart/',
+            f'/api/ingredients/?name={query}',
+        )
+
+    def handle(self, *args, **options):
+        client = APIClient()
+        client.force_authenticate(self.get_user(options['user']))
+        report = {
+            'revision': get_revision(),
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'recipes': Recipe.objects.count(),
+            'requests': options['requests'],
+            'endpoints': {},
+        }
+        for url in self.get_endpoints():
+            for _ in range(options['warmup']):
+                run_request(client, url)
+            timings, queries, sizes = zip(*(
+                run_request(client, url) for _ in range(options['requests'])
+            ))
+            result = {
+                f'p{percent}_ms': round(percentile(timings, percent), 3)
+                for percent in PERCENTILES
+            }
+            result.update(
+                mean_ms=round(statistics.mean(timings), 3),
+                max_ms=round(max(timings), 3),
+                queries=max(queries),
+                bytes=max(sizes),
+            )
+            report['endpoints'][url] = result
+            self.stdout.write(
+                f'{url}: p50 {result["p50_ms"]} мс, '
+                f'p95 {result["p95_ms"]} мс, запросов {result["queries"]}'
+            )
+        os.makedirs(os.path.dirname(os.path.abspath(options['output'])),
+                    exist_ok=True)
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f'Отчет сохранен в {options["output"]}'
+        ))
@@ -0,0 +1,104 @@
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.parse import urlencode, urljoin
+from urllib.request import Request, urlopen
+
+from api.management.commands.bench_api import (PERCENTILES, get_revision,
+                                               percentile)
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+ENDPOINTS = (
+    '/api/tags/',
+    '/api/ingredients/?' + urlencode({'name': 'мол'}),
+    '/api/recipes/',
+    '/api/recipes/?limit=20&ordering=-favorites_count',
+)
+
+
+def fetch(url, headers):
+    started = time.perf_counter()
+    try:
+        with urlopen(Request(url, headers=headers), timeout=30) as response:
+            response.read()
+            status = response.status
+    except HTTPError as error:
+        status = error.code
+    return (time.perf_counter() - started) * 1000, status
+
+
+class Command(BaseCommand):
+    help = ('Нагружает запущенный сервер параллельными GET-запросами и '
+            'замеряет пропускную способность. Одинаковые параметры для '
+            'WSGI и ASGI дают сравнимые отчеты.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('base_url', help='Например http://127.0.0.1:8000')
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='Эндпоинт для замера, можно указать несколько раз.'
+        )
+        parser.add_argument('--concurrency', type=int, default=64)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--token', help='Токен для авторизации.')
+        parser.add_argument('--label', default='',
+                            help='Метка отчета, например wsgi или asgi.')
+        parser.add_argument(
+            '--output',
+            default=os.path.join(settings.BENCH_REPORTS_DIR,
+                                 'bench_http.json'),
+            help='Куда сохранить отчет.'
+        )
+
+    def handle(self, *args, **options):
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+        report = {
+            'revision': get_revision(),
+            'created': timezone.now().isoformat(),
+            'label': options['label'],
+            'concurrency': options['concurrency'],
+            'requests': options['requests'],
+            'endpoints': {},
+        }
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            for path in options['paths'] or ENDPOINTS:
+                url = urljoin(options['base_url'], path)
+                fetch(url, headers)
+                started = time.perf_counter()
+                results = list(executor.map(
+                    lambda _: fetch(url, headers), range(options['requests'])
+                ))
+                elapsed = time.perf_counter() - started
+                timings = [timing for timing, _ in results]
+                errors = sum(status != 200 for _, status in results)
+                if errors == len(results):
+                    raise CommandError(f'{path}: все запросы с ошибкой')
+                result = {
+                    f'p{percent}_ms': round(percentile(timings, percent), 3)
+                    for percent in PERCENTILES
+                }
+                result.update(
+                    rps=round(len(results) / elapsed, 1),
+                    mean_ms=round(statistics.mean(timings), 3),
+                    errors=errors,
+                )
+                report['endpoints'][path] = result
+                self.stdout.write(
+                    f'{path}: {result["rps"]} запр/с, '
+                    f'p50 {result["p50_ms"]} мс, p99 {result["p99_ms"]} мс, '
+                    f'ошибок {errors}'
+                )
+        os.makedirs(os.path.dirname(os.path.abspath(options['output'])),
+                    exist_ok=True)
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f'Отчет сохранен в {options["output"]}'
+        ))
@@ -0,0 +1,90 @@
+import statistics
+import time
+from base64 import b64encode
+from urllib import parse
+
+from api.pagination import PageLimitPagination, RecipeCursorPagination
+from django.core.management.base import BaseCommand
+from recipes.models import Recipe
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from users.models import User
+
+SEED_BATCH_SIZE = 10000
+
+
+def seed_recipes(total):
+    author, _ = User.objects.get_or_create(
+        username='bench', defaults={'email': 'bench@example.com'}
+    )
+    count = Recipe.objects.count()
+    while count < total:
+        size = min(SEED_BATCH_SIZE, total - count)
+        Recipe.objects.bulk_create(
+            Recipe(author=author, name=f'bench-{count + number}',
+                   image='recipe/bench.png', text='', cooking_time=1)
+            for number in range(size)
+        )
+        count += size
+
+
+def encode_cursor(position):
+    tokens = parse.urlencode({'p': position})
+    return b64encode(tokens.encode('ascii')).decode('ascii')
+
+
+def measure(paginator, params, repeat):
+    factory = APIRequestFactory()
+    timings = []
+    for _ in range(repeat):
+        request = Request(factory.get('/api/recipes/', params))
+        started = time.perf_counter()
+        paginator.paginate_queryset(Recipe.objects.all(), request)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает постраничную и курсорную пагинацию '
+            'ленты рецептов на разной глубине.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000000)
+        parser.add_argument(
+            '--seed', action='store_true',
+            help='Дозаполнить базу рецептами до --recipes.'
+        )
+        parser.add_argument('--page-size', type=int, default=6)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--pages', default='1,10,100,1000,10000,100000',
+            help='Номера страниц через запятую.'
+        )
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            seed_recipes(options['recipes'])
+        total = Recipe.objects.count()
+        size = options['page_size']
+        self.stdout.write(f'Рецептов: {total}, размер страницы: {size}')
+        self.stdout.write(f'{"page":>8} {"page/limit, ms":>15} '
+                          f'{"cursor, ms":>12}')
+        for page in map(int, options['pages'].split(',')):
+            offset = (page - 1) * size
+            if offset >= total:
+                break
+            page_ms = measure(
+                PageLimitPagination(),
+                {'page': page, 'limit': size},
+                options['repeat'],
+            )
+            params = {'limit': size}
+            if offset:
+                position = Recipe.objects.order_by('-id').values_list(
+                    'id', flat=True
+                )[offset - 1]
+                params['cursor'] = encode_cursor(position)
+            cursor_ms = measure(
+                RecipeCursorPagination(), params, options['repeat']
+            )
+            self.stdout.write(f'{page:>8} {page_ms:>15.2f} {cursor_ms:>12.2f}')
@@ -0,0 +1,79 @@
+import asyncio
+from urllib.parse import urlsplit
+
+from api.management.commands.bench_http import ENDPOINTS
+from asgiref.testing import ApplicationCommunicator
+from django.core.management.base import BaseCommand, CommandError
+from foodgram.asgi import application
+from rest_framework.authtoken.models import Token
+
+AUTHENTICATED_ENDPOINTS = (
+    '/api/recipes/download_shopping_cart/?filetype=txt',
+    '/api/recipes/download_shopping_cart/?filetype=csv',
+    '/api/recipes/download_shopping_cart/?filetype=pdf',
+)
+TIMEOUT = 30
+
+
+async def fetch(path, headers):
+    url = urlsplit(path)
+    communicator = ApplicationCommunicator(application, {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': url.path,
+        'raw_path': url.path.encode(),
+        'query_string': url.query.encode(),
+        'root_path': '',
+        'headers': headers,
+        'client': ('127.0.0.1', 0),
+        'server': ('localhost', 80),
+    })
+    await communicator.send_input({'type': 'http.request', 'body': b''})
+    start = await communicator.receive_output(TIMEOUT)
+    size = 0
+    while True:
+        message = await communicator.receive_output(TIMEOUT)
+        size += len(message.get('body', b''))
+        if not message.get('more_body'):
+            return start['status'], size
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет GET-запросы через ASGI-приложение в этом же '
+            'процессе и проверяет, что ответы отдаются целиком.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='Эндпоинт для проверки, можно указать несколько раз.'
+        )
+        parser.add_argument(
+            '--token',
+            help=('Токен для авторизации. По умолчанию берется любой '
+                  'существующий.')
+        )
+
+    def handle(self, *args, **options):
+        key = options['token'] or (
+            Token.objects.values_list('key', flat=True).first()
+        )
+        headers = [(b'host', b'localhost')]
+        if key:
+            headers.append((b'authorization', f'Token {key}'.encode()))
+        failed = []
+        for path in options['paths'] or ENDPOINTS + AUTHENTICATED_ENDPOINTS:
+            try:
+                status, size = asyncio.run(fetch(path, headers))
+            except Exception as error:
+                failed.append(path)
+                self.stderr.write(f'{path}: {error!r}')
+                continue
+            if status >= 500:
+                failed.append(path)
+            self.stdout.write(f'{path}: {status}, {size} байт')
+        if failed:
+            raise CommandError(f'Ошибки под ASGI: {", ".join(failed)}')
+        self.stdout.write(self.style.SUCCESS('Все ответы получены'))
@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from recipes.models import Recipe, Tag
+from rest_framework.test import APIClient
+from users.models import User
+
+# Потолок SQL-запросов на эндпоинт без кеша: (аноним, авторизованный).
+# Страницы разного размера обязаны укладываться в одно и то же число.
+QUERY_BUDGETS = {
+    '/api/recipes/?limit={limit}': (7, 7),
+    '/api/recipes/?limit={limit}&tags={tag}': (8, 8),
+    '/api/recipes/{recipe_id}/': (7, 7),
+    '/api/recipes/feed/?limit={limit}': (None, 6),
+    '/api/users/?limit={limit}': (4, 4),
+    '/api/users/subscriptions/?limit={limit}': (None, 3),
+    '/api/tags/': (1, 1),
+    '/api/ingredients/': (1, 1),
+}
+PAGE_SIZES = (1, 10)
+NO_CACHE = {'default': {
+    'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+}}
+
+
+def count_queries(client, url):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+    if response.status_code != 200:
+        raise CommandError(f'{url}: статус {response.status_code}')
+    return len(queries)
+
+
+def check_endpoint(client, url, budget):
+    """Возвращает описание нарушения или None."""
+    recipe_id = Recipe.objects.values_list('id', flat=True).first()
+    tag = Tag.objects.values_list('slug', flat=True).first()
+    counts = {
+        limit: count_queries(
+            client, url.format(limit=limit, recipe_id=recipe_id, tag=tag)
+        )
+        for limit in (PAGE_SIZES if '{limit}' in url else PAGE_SIZES[:1])
+    }
+    if len(set(counts.values())) > 1:
+        return f'число запросов зависит от размера страницы: {counts}'
+    if max(counts.values()) > budget:
+        return f'{max(counts.values())} запросов при лимите {budget}'
+    return None
+
+
+class Command(BaseCommand):
+    help = ('Проверяет, что основные эндпоинты укладываются в заданное '
+            'число SQL-запросов и оно не растет с размером страницы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Имя пользователя для запросов.')
+
+    def handle(self, *args, **options):
+        if not Recipe.objects.exists():
+            raise CommandError('Нет рецептов: запустите seed_bench.')
+        user = (
+            User.objects.get(username=options['user']) if options['user']
+            else User.objects.filter(recipes__isnull=False).first()
+        )
+        authenticated = APIClient()
+        authenticated.force_authenticate(user)
+        clients = (('аноним', APIClient()), (user.username, authenticated))
+        failures = []
+        for url, budgets in QUERY_BUDGETS.items():
+            for (name, client), budget in zip(clients, budgets):
+                if budget is None:
+                    continue
+                # Без кеша замеряется холодный путь, и результат не
+                # зависит от того, что закешировали предыдущие запросы.
+                with override_settings(CACHES=NO_CACHE):
+                    problem = check_endpoint(client, url, budget)
+                label = f'{url} [{name}]'
+                if problem:
+                    failures.append(f'{label}: {problem}')
+                self.stdout.write(f'{label}: {problem or "ok"}')
+        if failures:
+            raise CommandError('\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Все эндпоинты в пределах'))
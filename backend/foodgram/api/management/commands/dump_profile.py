@@ -0,0 +1,74 @@
+import glob
+import json
+import os
+import time
+
+from api.profiling import METRICS, merge_stats, new_stats, percentile
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ('Сводит гистограммы профилирования запросов со всех воркеров '
+            'и печатает перцентили по каждому представлению.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--minutes', type=int, default=settings.REQUEST_PROFILING_WINDOW,
+            help='За сколько последних минут учитывать запросы.'
+        )
+        parser.add_argument('--json', action='store_true')
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Удалить накопленные данные после вывода.'
+        )
+
+    def handle(self, *args, **options):
+        since = int(time.time() // 60) - options['minutes']
+        paths = glob.glob(
+            os.path.join(settings.REQUEST_PROFILING_DIR, 'profile-*.json')
+        )
+        merged = {}
+        for path in paths:
+            with open(path, encoding='utf-8') as file:
+                windows = json.load(file)
+            for minute, labels in windows:
+                if minute < since:
+                    continue
+                for label, stats in labels.items():
+                    merge_stats(merged.setdefault(label, new_stats()), stats)
+        report = {
+            label: {
+                'count': stats['count'],
+                'with_duplicates': stats['duplicates'],
+                **{
+                    metric: {
+                        'mean': round(stats['sums'][metric] / stats['count'],
+                                      2),
+                        'p50': percentile(stats['buckets'][metric], 50),
+                        'p95': percentile(stats['buckets'][metric], 95),
+                        'p99': percentile(stats['buckets'][metric], 99),
+                    }
+                    for metric in METRICS
+                },
+            }
+            for label, stats in sorted(merged.items())
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            for label, stats in report.items():
+                self.stdout.write(
+                    f'{label}: {stats["count"]} запросов, '
+                    f'с повторами {stats["with_duplicates"]}'
+                )
+                for metric in METRICS:
+                    values = stats[metric]
+                    self.stdout.write(
+                        f'  {metric:<14} mean {values["mean"]:>10} '
+                        f'p50 ≤{values["p50"]:<8} p95 ≤{values["p95"]:<8} '
+                        f'p99 ≤{values["p99"]}'
+                    )
+        if options['reset']:
+            for path in paths:
+                os.remove(path)
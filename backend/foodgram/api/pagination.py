@@ -0,0 +1,41 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+MAX_PAGE_SIZE = 100
+
+
+class PageLimitPagination(PageNumberPagination):
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+
+
+class RecipeCursorPagination(CursorPagination):
+    ordering = '-id'
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+
+
+class RecipePagination(PageLimitPagination):
+    pagination_query_param = 'pagination'
+    cursor_query_param = 'cursor'
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def use_cursor(self, request):
+        return (
+            request.query_params.get(self.pagination_query_param) == 'cursor'
+            or self.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.cursor_paginator = RecipeCursorPagination()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
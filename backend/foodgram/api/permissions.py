@@ -11,7 +11,7 @@ class IsAdminModeratorAuthorOrReadOnly(permissions.BasePermission):
                 or request.user.is_superuser
                 or request.user.is_admin
                 or request.user.is_moderator
-                or obj.author == request.user)
+                or obj.author_id == request.user.id)
 
 
 class IsAdminOrSuperuser1OrReadOnly(permissions.BasePermission):
@@ -52,7 +52,7 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         return (
             request.method in permissions.SAFE_METHODS
-            or obj.author == request.user
+            or obj.author_id == request.user.id
         )
 
 
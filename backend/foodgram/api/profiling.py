@@ -0,0 +1,219 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = tuple(
+    multiplier * 10 ** exponent
+    for exponent in range(-1, 8) for multiplier in (1, 2, 5)
+)
+METRICS = ('total_ms', 'db_ms', 'serializer_ms', 'queries', 'bytes')
+
+
+def new_stats():
+    return {
+        'count': 0,
+        'duplicates': 0,
+        'sums': dict.fromkeys(METRICS, 0),
+        'buckets': {metric: [0] * (len(BUCKETS) + 1) for metric in METRICS},
+    }
+
+
+def merge_stats(target, source):
+    target['count'] += source['count']
+    target['duplicates'] += source['duplicates']
+    for metric in METRICS:
+        target['sums'][metric] += source['sums'][metric]
+        target['buckets'][metric] = [
+            left + right for left, right in zip(
+                target['buckets'][metric], source['buckets'][metric]
+            )
+        ]
+
+
+def bucket_index(value):
+    for index, bound in enumerate(BUCKETS):
+        if value <= bound:
+            return index
+    return len(BUCKETS)
+
+
+def percentile(buckets, percent):
+    total = sum(buckets)
+    if not total:
+        return 0
+    threshold = total * percent / 100
+    seen = 0
+    for index, count in enumerate(buckets):
+        seen += count
+        if seen >= threshold:
+            return BUCKETS[min(index, len(BUCKETS) - 1)]
+    return BUCKETS[-1]
+
+
+class RequestProfile:
+    def __init__(self):
+        self.label = None
+        self.queries = Counter()
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries[sql] += 1
+
+    def timed_serializer(self, to_representation):
+        def wrapper(instance):
+            started = time.perf_counter()
+            try:
+                return to_representation(instance)
+            finally:
+                self.serializer_time += time.perf_counter() - started
+        return wrapper
+
+    def get_duplicates(self):
+        threshold = settings.REQUEST_PROFILING_DUPLICATE_THRESHOLD
+        return {
+            sql: count for sql, count in self.queries.items()
+            if count >= threshold
+        }
+
+
+class ProfileRecorder:
+    """Копит статистику по минутам и сбрасывает ее в файл процесса.
+
+    Сброс идет каждые REQUEST_PROFILING_FLUSH_EVERY запросов, раз в
+    REQUEST_PROFILING_FLUSH_INTERVAL секунд и при выходе из процесса,
+    чтобы при слабом трафике или перезапуске данные не терялись.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.windows = deque(maxlen=settings.REQUEST_PROFILING_WINDOW)
+        self.requests = 0
+        self.dirty = False
+        self.path = os.path.join(settings.REQUEST_PROFILING_DIR,
+                                 f'profile-{os.getpid()}.json')
+        atexit.register(self.flush)
+        threading.Thread(
+            target=self.flush_periodically,
+            name='profiling-flush',
+            daemon=True,
+        ).start()
+
+    def add(self, label, values, duplicates):
+        minute = int(time.time() // 60)
+        with self.lock:
+            if not self.windows or self.windows[-1][0] != minute:
+                self.windows.append((minute, {}))
+            stats = self.windows[-1][1].setdefault(label, new_stats())
+            stats['count'] += 1
+            stats['duplicates'] += bool(duplicates)
+            for metric, value in values.items():
+                stats['sums'][metric] += value
+                stats['buckets'][metric][bucket_index(value)] += 1
+            self.requests += 1
+            self.dirty = True
+            flush = (
+                self.requests % settings.REQUEST_PROFILING_FLUSH_EVERY == 0
+            )
+        if flush:
+            self.flush()
+
+    def flush_periodically(self):
+        while True:
+            time.sleep(settings.REQUEST_PROFILING_FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                if not self.dirty:
+                    return
+                content = json.dumps(list(self.windows))
+                self.dirty = False
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(f'{self.path}.tmp', 'w', encoding='utf-8') as file:
+                file.write(content)
+            os.replace(f'{self.path}.tmp', self.path)
+
+
+def get_view_label(view_func, method):
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower(), method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.recorder = ProfileRecorder()
+
+    def __call__(self, request):
+        profile = request.profile = RequestProfile()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(profile.record_query)
+                )
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+        label = profile.label or request.path_info
+        duplicates = profile.get_duplicates()
+        if duplicates:
+            logger.warning(
+                '%s: повторяющиеся запросы %s', label,
+                '; '.join(f'{count}x {sql}'
+                          for sql, count in duplicates.items())
+            )
+        size = 0 if response.streaming else len(response.content)
+        self.recorder.add(label, {
+            'total_ms': total * 1000,
+            'db_ms': profile.db_time * 1000,
+            'serializer_ms': profile.serializer_time * 1000,
+            'queries': sum(profile.queries.values()),
+            'bytes': size,
+        }, duplicates)
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={profile.db_time * 1000:.2f};'
+            f'desc="{sum(profile.queries.values())} queries"',
+            f'serializer;dur={profile.serializer_time * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+            f'duplicates;desc="{sum(duplicates.values())} queries"',
+        ))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.profile.label = get_view_label(view_func, request.method)
+
+
+class ProfiledSerializerMixin:
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        profile = getattr(self.request, 'profile', None)
+        if profile is not None:
+            serializer.to_representation = profile.timed_serializer(
+                serializer.to_representation
+            )
+        return serializer
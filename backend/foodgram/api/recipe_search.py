@@ -0,0 +1,140 @@
+import re
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connections, router, transaction
+from django.db.models import F, OuterRef, Subquery, TextField
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from recipes.models import Ingredient, IngredientRecipe, Recipe
+
+from .caching import bump_version, get_version
+from .databases import use_primary
+
+WORD = re.compile(r'\w+')
+WEIGHTS = {'name': 1.0, 'ingredients': 0.4, 'text': 0.1}
+
+
+def get_words(value):
+    return WORD.findall(value.lower())
+
+
+def uses_database():
+    return connections[router.db_for_read(Recipe)].vendor == 'postgresql'
+
+
+def get_search_vector():
+    # Агрегаты contrib.postgres требуют psycopg2 уже при импорте.
+    from django.contrib.postgres.aggregates import StringAgg
+
+    config = settings.RECIPE_SEARCH_CONFIG
+    ingredients = IngredientRecipe.objects.filter(
+        recipe=OuterRef('pk')
+    ).order_by().values('recipe').annotate(
+        names=StringAgg('ingredient__name', ' ')
+    ).values('names')
+    return (
+        SearchVector('name', weight='A', config=config)
+        + SearchVector(
+            Subquery(ingredients, output_field=TextField()),
+            weight='B', config=config,
+        )
+        + SearchVector('text', weight='C', config=config)
+    )
+
+
+def update_search_vectors(recipes):
+    bump_version('recipes-search')
+    if uses_database():
+        recipes.update(search_vector=get_search_vector())
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, **kwargs):
+    transaction.on_commit(lambda: update_search_vectors(
+        Recipe.objects.filter(pk=instance.pk)
+    ))
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, created, **kwargs):
+    if created:
+        return
+    transaction.on_commit(lambda: update_search_vectors(
+        Recipe.objects.filter(ingredients__ingredient=instance)
+    ))
+
+
+class RecipeIndex:
+    def __init__(self):
+        self.data = (None, [], [])
+
+    def build(self, version):
+        documents = defaultdict(lambda: defaultdict(float))
+        rows = Recipe.objects.values_list('id', 'name', 'text')
+        for recipe_id, name, text in rows.iterator():
+            for field, value in (('name', name), ('text', text)):
+                for word in get_words(value):
+                    documents[word][recipe_id] += WEIGHTS[field]
+        rows = IngredientRecipe.objects.values_list(
+            'recipe_id', 'ingredient__name'
+        )
+        for recipe_id, name in rows.iterator():
+            for word in get_words(name):
+                documents[word][recipe_id] += WEIGHTS['ingredients']
+        words = sorted(documents)
+        self.data = (version, words, [documents[word] for word in words])
+
+    def search(self, query):
+        version = get_version('recipes-search')
+        if version != self.data[0]:
+            # Как и индекс ингредиентов, строится с основной базы.
+            with use_primary():
+                self.build(version)
+        _, words, postings = self.data
+        scores = None
+        for term in set(get_words(query)):
+            matches = defaultdict(float)
+            position = bisect_left(words, term)
+            while (position < len(words)
+                   and words[position].startswith(term)):
+                for recipe_id, weight in postings[position].items():
+                    matches[recipe_id] += weight
+                position += 1
+            if scores is None:
+                scores = matches
+            else:
+                scores = {
+                    recipe_id: score + matches[recipe_id]
+                    for recipe_id, score in scores.items()
+                    if recipe_id in matches
+                }
+        return scores or {}
+
+
+index = RecipeIndex()
+
+
+def search_in_database(queryset, query):
+    query = SearchQuery(query, config=settings.RECIPE_SEARCH_CONFIG)
+    return queryset.filter(search_vector=query).annotate(
+        search_rank=SearchRank(F('search_vector'), query)
+    )
+
+
+def rank_in_memory(ids, query, keep_order=False):
+    """Оставляет из ids найденные по индексу рецепты, лучшие — первыми.
+
+    Ранг считается в Python, а не выражением в SQL: иначе запрос растет
+    с числом найденных рецептов. При keep_order порядок ids сохраняется.
+    """
+    scores = index.search(query)
+    found = [recipe_id for recipe_id in ids if recipe_id in scores]
+    if keep_order:
+        return found
+    return sorted(
+        found, key=lambda recipe_id: (-scores[recipe_id], -recipe_id)
+    )
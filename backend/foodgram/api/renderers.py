@@ -0,0 +1,33 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ORJSON_OPTIONS = (
+    orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    if orjson is not None else 0
+)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson, если тот установлен, иначе на json."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii
+                or not self.compact or self.get_indent(
+                    accepted_media_type, renderer_context or {}
+                ) is not None):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        content = orjson.dumps(
+            data, default=self.encoder_class().default,
+            option=ORJSON_OPTIONS,
+        )
+        if b'\xe2\x80\xa8' in content or b'\xe2\x80\xa9' in content:
+            content = content.replace(
+                b'\xe2\x80\xa8', b'\\u2028'
+            ).replace(b'\xe2\x80\xa9', b'\\u2029')
+        return content
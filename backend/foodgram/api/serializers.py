@@ -1,30 +1,43 @@
-import base64
 import datetime
 
+from django.conf import settings
 from django.contrib.auth.hashers import make_password
-from django.core.files.base import ContentFile
+from django.db import transaction
 from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
-                            ShoppingCart, Tag)
+                            ShoppingCart, ShoppingListItem, Tag)
 from rest_framework import serializers
+from tasks.queue import enqueue
 from users.models import Follow, User
 
+from .feed import fan_out
+from .images import decode_base64_image, generate_variants
+from .sparse_fields import SparseFieldsMixin
+
 
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(
-                base64.b64decode(imgstr),
-                name=str(datetime.datetime.now().timestamp()) + '.' + ext,
+            data = decode_base64_image(
+                data, str(datetime.datetime.now().timestamp())
             )
+            return serializers.FileField.to_internal_value(self, data)
         return super().to_internal_value(data)
 
     def to_representation(self, value):
         return value.url
 
 
-class CustomUserSerializers(serializers.ModelSerializer):
+class ImageVariantField(serializers.ReadOnlyField):
+    def __init__(self, variant, **kwargs):
+        self.variant = variant
+        super().__init__(source='*', **kwargs)
+
+    def to_representation(self, recipe):
+        image = getattr(recipe, f'image_{self.variant}') or recipe.image
+        return image.url
+
+
+class CustomUserSerializers(SparseFieldsMixin, serializers.ModelSerializer):
     password = serializers.CharField(
         write_only=True,
         required=True,
@@ -37,6 +50,8 @@ class CustomUserSerializers(serializers.ModelSerializer):
         fields = '__all__'
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return self.context.get('request') and not (
             self.context['request'].user.is_anonymous
         ) and Follow.objects.filter(
@@ -75,17 +90,20 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = CustomUserSerializers(read_only=True)
     tags = TagSerializer(many=True, read_only=True)
     ingredients = IngredientRecipeSerializer(read_only=True, many=True)
     image = Base64ImageField()
-    is_favorited = serializers.BooleanField(default=False)
-    is_in_shopping_cart = serializers.BooleanField(default=False)
+    image_small = ImageVariantField('small')
+    image_medium = ImageVariantField('medium')
+    is_favorited = serializers.BooleanField(read_only=True, default=False)
+    is_in_shopping_cart = serializers.BooleanField(read_only=True,
+                                                   default=False)
 
     class Meta:
         model = Recipe
-        fields = '__all__'
+        exclude = ('search_vector',)
 
     @staticmethod
     def get_in(self, user, model, obj):
@@ -123,14 +141,42 @@ class RecipeSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError()
         return data
 
-    def ingredient_recipe_create(self, ingredients_set, recipe):
-        for ingredient_get in ingredients_set:
-            ingredient = Ingredient.objects.get(id=ingredient_get.get('id'))
-            IngredientRecipe.objects.create(ingredient=ingredient,
-                                            recipe=recipe,
-                                            amount=ingredient_get.get('amount')
-                                            )
+    def get_amounts(self, ingredients_set):
+        return {
+            int(ingredient_get['id']): int(ingredient_get['amount'])
+            for ingredient_get in ingredients_set
+        }
+
+    def ingredient_recipe_set(self, ingredients_set, recipe, existing=()):
+        amounts = self.get_amounts(ingredients_set)
+        ingredients = Ingredient.objects.in_bulk(list(amounts))
+        if len(ingredients) != len(amounts):
+            raise serializers.ValidationError(
+                {'ingredients': 'Ингредиент не найден.'}
+            )
+        existing = {row.ingredient_id: row for row in existing}
+        IngredientRecipe.objects.filter(id__in=[
+            row.id for ingredient_id, row in existing.items()
+            if ingredient_id not in amounts
+        ]).delete()
+        changed = []
+        for ingredient_id, row in existing.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        IngredientRecipe.objects.bulk_update(changed, ('amount',))
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
+                ingredient=ingredients[ingredient_id],
+                recipe=recipe,
+                amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
+        )
 
+    @transaction.atomic
     def create(self, validated_data):
         image = validated_data.pop('image')
         recipe = Recipe.objects.create(
@@ -138,37 +184,63 @@ class RecipeSerializer(serializers.ModelSerializer):
             author=self.context['request'].user,
             **validated_data
         )
+        image.close()
         tags = self.initial_data.get('tags')
         recipe.tags.set(tags)
         ingredients_set = self.initial_data.get('ingredients')
-        self.ingredient_recipe_create(
-            ingredients_set,
-            recipe
-        )
+        self.ingredient_recipe_set(ingredients_set, recipe)
+        enqueue(generate_variants, recipe.id)
+        enqueue(fan_out, recipe.id)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.image = validated_data.get('image', instance.image)
+        image = validated_data.get('image')
+        if image is not None:
+            previous = instance.image.name
+            instance.image.save(image.name, image, save=False)
+            image.close()
+            if instance.image.name != previous:
+                instance.image_small = instance.image_medium = ''
+                enqueue(generate_variants, instance.id)
         instance.name = validated_data.get('name', instance.name)
         instance.text = validated_data.get('text', instance.text)
         instance.cooking_time = validated_data.get('cooking_time',
                                                    instance.cooking_time)
-        instance.tags.clear()
         tags = self.initial_data.get('tags')
         instance.tags.set(tags)
         instance.save()
-        IngredientRecipe.objects.filter(recipe=instance).delete()
         ingredients_set = self.initial_data.get('ingredients')
-        self.ingredient_recipe_create(ingredients_set, instance)
+        existing = list(IngredientRecipe.objects.filter(recipe=instance))
+        if ({row.ingredient_id: row.amount for row in existing}
+                != self.get_amounts(ingredients_set)):
+            ShoppingListItem.objects.remove_recipe(instance.id)
+            self.ingredient_recipe_set(ingredients_set, instance, existing)
+            ShoppingListItem.objects.add_recipe(instance.id)
         return instance
 
 
+class ShoppingListItemSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
+    )
+
+    class Meta:
+        model = ShoppingListItem
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+
+
 class RecipeReadSerializer(serializers.ModelSerializer):
     image = Base64ImageField()
+    image_small = ImageVariantField('small')
+    image_medium = ImageVariantField('medium')
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_small', 'image_medium',
+                  'cooking_time')
 
 
 class FollowSerializer(serializers.ModelSerializer):
@@ -186,15 +258,20 @@ class FollowSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
     def get_is_subscribed(self, obj):
-        return Follow.objects.filter(
-            user=obj.user, author=obj.author
-        ).exists()
+        return True
 
     def get_recipes(self, obj):
-        queryset = Recipe.objects.filter(author=obj.author)
+        queryset = getattr(obj.author, 'recipes_preview', None)
+        if queryset is None:
+            queryset = Recipe.objects.filter(author=obj.author)
+            recipes_limit = self.context.get('recipes_limit')
+            if recipes_limit:
+                queryset = queryset[:recipes_limit]
         return RecipeReadSerializer(queryset, many=True).data
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return Recipe.objects.filter(author=obj.author).count()
 
 
@@ -224,3 +301,19 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
         if user.is_anonymous:
             return False
         return ShoppingCart.objects.filter(user=user, author=obj.id).exists()
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    add = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), default=list,
+        max_length=settings.RECIPE_STATE_MAX_IDS
+    )
+    remove = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), default=list,
+        max_length=settings.RECIPE_STATE_MAX_IDS
+    )
+
+
+class RecipeStateChangeSerializer(serializers.Serializer):
+    favorite = RecipeIdsSerializer(required=False)
+    shopping_cart = RecipeIdsSerializer(required=False)
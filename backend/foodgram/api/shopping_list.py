@@ -0,0 +1,102 @@
+import csv
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import F
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from recipes.models import Recipe, ShoppingListItem
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+CHUNK_SIZE = 64 * 1024
+PDF_FONT_NAME = 'ShoppingListFont'
+PDF_FONT_SIZE = 12
+PDF_LINE_HEIGHT = 18
+PDF_MARGIN = 50
+
+
+def get_shopping_list(user):
+    return (
+        ShoppingListItem.objects
+        .filter(user=user)
+        .values(
+            'amount',
+            name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit'),
+        )
+        .order_by('name', 'measurement_unit')
+    )
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_deleted_recipe(sender, instance, **kwargs):
+    ShoppingListItem.objects.remove_recipe(instance.pk)
+
+
+def render_txt(rows):
+    for index, row in enumerate(rows, start=1):
+        yield (f'{index}. {row["name"]} - {row["amount"]} '
+               f'{row["measurement_unit"]}\n')
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def render_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'amount', 'measurement_unit'))
+    for row in rows:
+        yield writer.writerow(
+            (row['name'], row['amount'], row['measurement_unit'])
+        )
+
+
+def get_pdf_font():
+    font_path = settings.SHOPPING_LIST_PDF_FONT
+    if not font_path or not os.path.isfile(font_path):
+        raise ImproperlyConfigured(
+            f'Не найден шрифт для PDF: {font_path!r}. Укажите в '
+            'SHOPPING_LIST_PDF_FONT TTF-файл с кириллицей, например '
+            'DejaVuSans.ttf.'
+        )
+    if PDF_FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(PDF_FONT_NAME, font_path))
+    return PDF_FONT_NAME
+
+
+def render_pdf(rows):
+    # Шрифт проверяется до начала потока, чтобы ошибка настройки дала
+    # 500, а не оборванный файл.
+    return write_pdf(rows, get_pdf_font())
+
+
+def write_pdf(rows, font):
+    width, height = A4
+    with tempfile.SpooledTemporaryFile(max_size=CHUNK_SIZE) as buffer:
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        pdf.setFont(font, PDF_FONT_SIZE)
+        y = height - PDF_MARGIN
+        for line in render_txt(rows):
+            if y < PDF_MARGIN:
+                pdf.showPage()
+                pdf.setFont(font, PDF_FONT_SIZE)
+                y = height - PDF_MARGIN
+            pdf.drawString(PDF_MARGIN, y, line.rstrip('\n'))
+            y -= PDF_LINE_HEIGHT
+        pdf.save()
+        buffer.seek(0)
+        yield from iter(lambda: buffer.read(CHUNK_SIZE), b'')
+
+
+RENDERERS = {
+    'txt': (render_txt, 'text/plain; charset=utf-8'),
+    'csv': (render_csv, 'text/csv; charset=utf-8'),
+    'pdf': (render_pdf, 'application/pdf'),
+}
@@ -0,0 +1,45 @@
+from rest_framework.serializers import ListSerializer
+
+
+def get_names(request, param):
+    if request is None:
+        return None
+    value = request.query_params.get(param)
+    if not value:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def is_selected(request, name):
+    fields = get_names(request, 'fields')
+    omit = get_names(request, 'omit')
+    return (fields is None or name in fields) and (
+        omit is None or name not in omit
+    )
+
+
+class SparseFieldsMixin:
+    """Оставляет в ответе только поля из ?fields= и убирает поля из ?omit=.
+
+    Действует только на сериализатор верхнего уровня: вложенные
+    сериализаторы, например автор рецепта, выводятся целиком.
+    """
+
+    def is_root(self):
+        parent = self.parent
+        if isinstance(parent, ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.is_root():
+            return fields
+        request = self.context.get('request')
+        if (request is None or request.method != 'GET'
+                or not self.context.get('sparse_fields', True)):
+            return fields
+        return {
+            name: field for name, field in fields.items()
+            if is_selected(request, name)
+        }
@@ -1,23 +1,61 @@
-from django.db.models import BooleanField, Exists, OuterRef, Value
-from django.http import HttpResponse
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import (BooleanField, Count, Exists, F, OuterRef,
+                              Prefetch, Subquery, Value)
+from django.http import HttpResponseNotModified, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django_filters.rest_framework import FilterSet, filters
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django_filters.rest_framework import (DjangoFilterBackend, FilterSet,
+                                           filters)
 from djoser.views import UserViewSet
-from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCart, ShoppingListItem, Tag)
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.filters import SearchFilter
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
 from rest_framework.response import Response
+from tasks.queue import enqueue
 from users.models import Follow, User
 
+from .caching import CachedListMixin, get_versions, is_not_modified
+from .databases import ReplicaReadMixin
+from .feed import backfill, prune
+from .ingredient_search import search_ingredients
+from .pagination import (PageLimitPagination, RecipeCursorPagination,
+                         RecipePagination)
+from .permissions import IsAdminModeratorAuthorOrReadOnly
+from .profiling import ProfiledSerializerMixin
+from .recipe_search import rank_in_memory, search_in_database, uses_database
 from .serializers import (FavoriteSerializer, FollowSerializer,
                           IngredientSerializer, RecipeSerializer,
-                          ShoppingCartSerializer, TagSerializer)
-
+                          RecipeStateChangeSerializer, ShoppingCartSerializer,
+                          ShoppingListItemSerializer, TagSerializer)
+from .shopping_list import RENDERERS, get_shopping_list
+from .sparse_fields import is_selected
 
-class IngredientSearchFilter(SearchFilter):
-    search_param = 'name'
+PERSONAL_FIELDS = (
+    'is_favorited', 'is_in_shopping_cart',
+    'favorites_count', 'shopping_carts_count',
+)
+DEFERRABLE_COLUMNS = {
+    'name': ('name',),
+    'text': ('text',),
+    'image': ('image', 'image_small', 'image_medium'),
+    'image_small': ('image_small',),
+    'image_medium': ('image_medium',),
+    'cooking_time': ('cooking_time',),
+    'updated_at': ('updated_at',),
+}
+USER_RELATED_FIELDS = ('groups', 'user_permissions', 'is_subscribed')
+STATE_MODELS = {
+    'favorite': (Favorite, 'favorites_count'),
+    'shopping_cart': (ShoppingCart, 'shopping_carts_count'),
+}
 
 
 class RecipeFilter(FilterSet):
@@ -29,6 +67,7 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
@@ -44,21 +83,123 @@ class RecipeFilter(FilterSet):
             return queryset.filter(shopping_carts__user=self.request.user)
         return queryset
 
+    def filter_search(self, queryset, name, value):
+        # Без PostgreSQL рецепты по индексу в памяти отбирает
+        # RecipeViewSet.list.
+        if not uses_database():
+            return queryset
+        return search_in_database(queryset, value)
+
+
+class RecipeOrderingFilter(OrderingFilter):
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering or any(
+            field.lstrip('-') == 'id' for field in ordering
+        ):
+            return ordering
+        # Счетчики часто равны: без id порядок внутри равных не определен,
+        # и между страницами рецепты повторяются или теряются. Направление
+        # совпадает с первым полем, чтобы работали индексы (-count, -id).
+        tiebreaker = '-id' if ordering[0].startswith('-') else 'id'
+        return (*ordering, tiebreaker)
+
+    def get_default_ordering(self, view):
+        if view.request.query_params.get('search') and uses_database():
+            return ('-search_rank', '-id')
+        return super().get_default_ordering(view)
+
+
+def prepare_users(queryset, user, fields=None):
+    queryset = queryset.prefetch_related(*(
+        name for name in ('groups', 'user_permissions')
+        if fields is None or name in fields
+    ))
+    if fields is not None and 'is_subscribed' not in fields:
+        return queryset
+    if user.is_anonymous:
+        return queryset.annotate(
+            is_subscribed=Value(False, output_field=BooleanField())
+        )
+    return queryset.annotate(
+        is_subscribed=Exists(Follow.objects.filter(
+            user=user, author=OuterRef('pk'))
+        )
+    )
+
+
+def annotate_flags(queryset, user, is_subscribed=False,
+                   fields=('is_favorited', 'is_in_shopping_cart')):
+    if user.is_anonymous:
+        false = Value(False, output_field=BooleanField())
+        flags = dict.fromkeys(fields, false)
+        if is_subscribed:
+            flags['is_subscribed'] = false
+        return queryset.annotate(**flags)
+    flags = dict(
+        is_favorited=Exists(Favorite.objects.filter(
+            user=user, recipe__pk=OuterRef('pk'))
+        ),
+        is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+            user=user, recipe__pk=OuterRef('pk'))
+        ),
+    )
+    flags = {name: flags[name] for name in fields}
+    if is_subscribed:
+        flags['is_subscribed'] = Exists(Follow.objects.filter(
+            user=user, author=OuterRef('author'))
+        )
+    return queryset.annotate(**flags)
+
 
-class CustomUserViewSet(UserViewSet):
+class CustomUserViewSet(ProfiledSerializerMixin, UserViewSet):
     queryset = User.objects.all()
     permission_classes = (permissions.AllowAny,)
-    pagination_class = PageNumberPagination
+    pagination_class = PageLimitPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            queryset = prepare_users(
+                queryset, self.request.user, fields={
+                    name for name in USER_RELATED_FIELDS
+                    if is_selected(self.request, name)
+                }
+            )
+        return queryset
+
+    def get_recipes_limit(self):
+        limit = self.request.query_params.get('recipes_limit', '')
+        if limit.isdigit() and int(limit) > 0:
+            return int(limit)
+        return None
 
     @action(detail=False, permission_classes=[permissions.IsAuthenticated])
     def subscriptions(self, request):
-        user = request.user
-        queryset = Follow.objects.filter(user=user)
+        recipes_limit = self.get_recipes_limit()
+        recipes = Recipe.objects.only(
+            'id', 'author', 'name', 'image', 'image_small', 'image_medium',
+            'cooking_time'
+        )
+        if recipes_limit:
+            recipes = recipes.filter(id__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).values('id')[:recipes_limit]
+            ))
+        queryset = Follow.objects.filter(
+            user=request.user
+        ).select_related('author').annotate(
+            recipes_count=Count('author__recipes')
+        ).prefetch_related(
+            Prefetch('author__recipes', queryset=recipes,
+                     to_attr='recipes_preview')
+        ).order_by('-id')
         pages = self.paginate_queryset(queryset)
         serializer = FollowSerializer(
             pages,
             many=True,
-            context={'request': request}
+            context={'request': request, 'recipes_limit': recipes_limit}
         )
         return self.get_paginated_response(serializer.data)
 
@@ -74,8 +215,11 @@ class CustomUserViewSet(UserViewSet):
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
         follow = Follow.objects.create(user=user, author=author)
+        enqueue(backfill, user.id, author.id)
         serializer = FollowSerializer(
-            follow, context={'request': request}
+            follow,
+            context={'request': request,
+                     'recipes_limit': self.get_recipes_limit()}
         )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -88,143 +232,305 @@ class CustomUserViewSet(UserViewSet):
         follow = Follow.objects.filter(user=user, author=author)
         if not follow.exists():
             return Response(status=status.HTTP_400_BAD_REQUEST)
-        follow.delete()
+        with transaction.atomic():
+            follow.delete()
+            prune(user.id, author.id)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class TagsViewSet(viewsets.ReadOnlyModelViewSet):
+class TagsViewSet(ProfiledSerializerMixin, ReplicaReadMixin, CachedListMixin,
+                  viewsets.ReadOnlyModelViewSet):
     permission_classes = (permissions.AllowAny,)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    cache_prefix = 'tags'
 
 
-class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientsViewSet(ProfiledSerializerMixin, ReplicaReadMixin,
+                         CachedListMixin, viewsets.ReadOnlyModelViewSet):
     permission_classes = (permissions.AllowAny,)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = (IngredientSearchFilter,)
-    search_fields = ('^name',)
     pagination_class = None
+    cache_prefix = 'ingredients'
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name', '').strip()
+        if name:
+            return Response(search_ingredients(name))
+        return super().list(request, *args, **kwargs)
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(ProfiledSerializerMixin, ReplicaReadMixin,
+                    viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
-    pagination_class = PageNumberPagination
-    permission_classes = (permissions.AllowAny,)
+    pagination_class = RecipePagination
+    permission_classes = (IsAdminModeratorAuthorOrReadOnly,)
     serializer_class = RecipeSerializer
-    filter_class = RecipeFilter
+    filter_backends = (DjangoFilterBackend, RecipeOrderingFilter)
+    filterset_class = RecipeFilter
+    ordering_fields = ('id', 'favorites_count', 'shopping_carts_count')
+    ordering = ('-id',)
+    replica_actions = ('list',)
+
+    def is_field_selected(self, name):
+        return (self.action not in ('list', 'feed')
+                or is_selected(self.request, name))
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == 'retrieve':
+            context['sparse_fields'] = False
+        return context
 
     def get_queryset(self):
         user = self.request.user
         queryset = Recipe.objects.all()
-
-        if user.is_authenticated:
-            queryset = queryset.annotate(
-                is_favorited=Exists(Favorite.objects.filter(
-                    user=user, recipe__pk=OuterRef('pk'))
+        if self.action in ('list', 'retrieve', 'feed'):
+            related = {
+                'author': Prefetch(
+                    'author',
+                    queryset=prepare_users(User.objects.all(), user)
                 ),
-                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
-                    user=user, recipe__pk=OuterRef('pk'))
-                )
-            )
+                'tags': 'tags',
+                'ingredients': Prefetch(
+                    'ingredients',
+                    queryset=IngredientRecipe.objects.select_related(
+                        'ingredient'
+                    )
+                ),
+            }
+            queryset = queryset.prefetch_related(*(
+                lookup for name, lookup in related.items()
+                if self.is_field_selected(name)
+            )).defer('search_vector', *(
+                column for column, fields in DEFERRABLE_COLUMNS.items()
+                if not any(self.is_field_selected(name) for name in fields)
+            ))
+        return annotate_flags(queryset, user, fields=[
+            name for name in ('is_favorited', 'is_in_shopping_cart')
+            if self.is_field_selected(name)
+        ])
+
+    def list(self, request, *args, **kwargs):
+        query = request.query_params.get('search')
+        if not query or uses_database():
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        ids = rank_in_memory(
+            queryset.values_list('id', flat=True), query,
+            keep_order=bool(request.query_params.get('ordering')),
+        )
+        # Найденные id упорядочены в Python, поэтому курсор, который
+        # опирается на порядок в SQL, здесь не работает: делим по номеру
+        # страницы и загружаем из базы только ее рецепты.
+        paginator = PageLimitPagination()
+        page = paginator.paginate_queryset(ids, request, view=self)
+        recipes = queryset.in_bulk(page)
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for recipe_id in page], many=True
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        user = request.user
+        recipe = get_object_or_404(
+            annotate_flags(Recipe.objects.only(
+                'id', 'author', 'updated_at',
+                'favorites_count', 'shopping_carts_count'
+            ), user, is_subscribed=True),
+            pk=kwargs[self.lookup_field]
+        )
+        stamp = ':'.join(str(part) for part in (
+            recipe.pk, recipe.updated_at.timestamp(),
+            *get_versions('tags', 'ingredients', f'users:{recipe.author_id}')
+        ))
+        personal = {field: getattr(recipe, field) for field in PERSONAL_FIELDS}
+        selection = (request.query_params.get('fields'),
+                     request.query_params.get('omit'))
+        etag = '"{}"'.format(hashlib.md5(
+            f'{stamp}:{sorted(personal.items())}:{recipe.is_subscribed}:'
+            f'{selection}'.encode()
+        ).hexdigest())
+        if is_not_modified(request, etag):
+            response = HttpResponseNotModified()
         else:
-            queryset = queryset.annotate(
-                is_favorited=Value(False, output_field=BooleanField()),
-                is_in_shopping_cart=Value(False, output_field=BooleanField())
+            data = cache.get(f'recipe:{stamp}')
+            if data is None:
+                data = dict(self.get_serializer(self.get_object()).data)
+                cache.set(
+                    f'recipe:{stamp}', data, settings.RECIPE_CACHE_TIMEOUT
+                )
+            data = dict(
+                data, **personal,
+                author=dict(data['author'], is_subscribed=recipe.is_subscribed)
             )
-        return queryset
+            response = Response({
+                name: value for name, value in data.items()
+                if is_selected(request, name)
+            })
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(recipe.updated_at.timestamp())
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Authorization',))
+        return response
 
-    @action(detail=True, methods=['post', 'delete'],
-            permission_classes=[permissions.IsAuthenticated])
-    def favorite(self, request, pk=None):
+    def add_or_remove(self, request, pk, model, serializer_class, counter):
         user = request.user
-        recipe = get_object_or_404(Recipe, id=pk)
-        favorite = Favorite.objects.filter(user=user, recipe=recipe)
-        if not favorite.exists():
-            Favorite.objects.create(
-                user=user,
-                recipe=get_object_or_404(Recipe, id=pk)
-            )
-            queryset = Favorite.objects.get(
-                user=user,
-                recipe=get_object_or_404(Recipe, id=pk)
+        if request.method == 'POST':
+            recipe = get_object_or_404(
+                Recipe.objects.only('id', 'name', 'image', 'cooking_time'),
+                id=pk
             )
-            serializer = FavoriteSerializer(
-                queryset,
+            with transaction.atomic():
+                if not model.objects.add(user, recipe):
+                    return Response(status=status.HTTP_400_BAD_REQUEST)
+                Recipe.objects.filter(id=pk).update(
+                    **{counter: F(counter) + 1}
+                )
+                if model is ShoppingCart:
+                    ShoppingListItem.objects.add_recipe(recipe.id, user)
+            serializer = serializer_class(
+                model(user=user, recipe=recipe),
                 context={'request': request}
             )
-            return Response(
-                serializer.data,
-                status=status.HTTP_201_CREATED
-            )
-        favorite.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        with transaction.atomic():
+            removed = model.objects.remove(user, pk)
+            if removed:
+                Recipe.objects.filter(id=pk, **{f'{counter}__gt': 0}).update(
+                    **{counter: F(counter) - 1}
+                )
+                if model is ShoppingCart:
+                    ShoppingListItem.objects.remove_recipe(pk, user)
+        if removed:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        get_object_or_404(Recipe, id=pk)
+        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=['post', 'delete'],
+            permission_classes=[permissions.IsAuthenticated])
+    def favorite(self, request, pk=None):
+        return self.add_or_remove(
+            request, pk, Favorite, FavoriteSerializer, 'favorites_count'
+        )
 
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=(permissions.IsAuthenticated,),
             pagination_class=None)
     def shopping_cart(self, request, pk=None):
-        user = request.user
-        recipe = get_object_or_404(Recipe, id=pk)
-        cart = ShoppingCart.objects.filter(user=user, recipe=recipe)
-        if request.method == 'POST':
-            if not cart.exists():
-                ShoppingCart.objects.create(
-                    user=user,
-                    recipe=get_object_or_404(Recipe, id=pk)
-                )
-                queryset = ShoppingCart.objects.get(
-                    user=user,
-                    recipe=get_object_or_404(Recipe, id=pk)
+        return self.add_or_remove(
+            request, pk, ShoppingCart, ShoppingCartSerializer,
+            'shopping_carts_count'
+        )
+
+    @action(detail=False, methods=['get'],
+            permission_classes=(permissions.IsAuthenticated,),
+            pagination_class=RecipeCursorPagination, filter_backends=())
+    def feed(self, request):
+        queryset = self.get_queryset().filter(feed_entries__user=request.user)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def get_state_ids(self, request):
+        try:
+            ids = [
+                int(recipe_id) for recipe_id
+                in request.query_params.get('ids', '').split(',') if recipe_id
+            ]
+        except ValueError:
+            raise ValidationError({'ids': 'Ожидаются id через запятую.'})
+        if len(ids) > settings.RECIPE_STATE_MAX_IDS:
+            raise ValidationError({
+                'ids': f'Не больше {settings.RECIPE_STATE_MAX_IDS} id.'
+            })
+        return list(dict.fromkeys(ids))
+
+    def change_state(self, user, changes):
+        ids = list(dict.fromkeys(
+            recipe_id for change in changes.values()
+            for recipe_id in change['add'] + change['remove']
+        ))
+        found = Recipe.objects.filter(id__in=ids).values_list('id', flat=True)
+        missing = set(ids) - set(found)
+        if missing:
+            raise ValidationError({
+                'ids': f'Рецепты не найдены: {sorted(missing)}'
+            })
+        with transaction.atomic():
+            for name, change in changes.items():
+                model, counter = STATE_MODELS[name]
+                added = model.objects.add_many(
+                    user, list(dict.fromkeys(change['add']))
                 )
-                serializer = ShoppingCartSerializer(
-                    queryset,
-                    context={'request': request}
+                removed = model.objects.remove_many(
+                    user, list(dict.fromkeys(change['remove']))
                 )
-                return Response(
-                    serializer.data,
-                    status=status.HTTP_201_CREATED
+                Recipe.objects.filter(id__in=added).update(
+                    **{counter: F(counter) + 1}
                 )
-            return Response(status=status.HTTP_400_BAD_REQUEST)
-        if request.method == 'DELETE':
-            user = request.user
-            recipe = get_object_or_404(Recipe, id=pk)
-            cart = get_object_or_404(
-                ShoppingCart,
-                user=user,
-                recipe=recipe
-            )
-            cart.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+                Recipe.objects.filter(
+                    id__in=removed, **{f'{counter}__gt': 0}
+                ).update(**{counter: F(counter) - 1})
+                if model is ShoppingCart:
+                    ShoppingListItem.objects.add_recipes(added, user)
+                    ShoppingListItem.objects.remove_recipes(removed, user)
+        return ids
+
+    @action(detail=False, methods=['get', 'post'],
+            permission_classes=(permissions.IsAuthenticated,),
+            pagination_class=None, filter_backends=())
+    def state(self, request):
+        if request.method == 'GET':
+            ids = self.get_state_ids(request)
+        else:
+            serializer = RecipeStateChangeSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            ids = self.change_state(request.user, serializer.validated_data)
+        favorited = set(Favorite.objects.filter(
+            user=request.user, recipe_id__in=ids
+        ).values_list('recipe_id', flat=True))
+        in_cart = set(ShoppingCart.objects.filter(
+            user=request.user, recipe_id__in=ids
+        ).values_list('recipe_id', flat=True))
+        return Response([
+            {
+                'id': recipe_id,
+                'is_favorited': recipe_id in favorited,
+                'is_in_shopping_cart': recipe_id in in_cart,
+            }
+            for recipe_id in ids
+        ])
+
+    @action(detail=False, methods=['get'],
+            permission_classes=(permissions.IsAuthenticated,),
+            pagination_class=None, filter_backends=())
+    def shopping_list(self, request):
+        items = ShoppingListItem.objects.filter(
+            user=request.user
+        ).select_related('ingredient').order_by(
+            'ingredient__name', 'ingredient__measurement_unit'
+        )
+        serializer = ShoppingListItemSerializer(items, many=True)
+        return Response(serializer.data)
 
     @action(
         detail=False, methods=['get'],
         permission_classes=[permissions.IsAuthenticated])
     def download_shopping_cart(self, request):
-        user = get_object_or_404(User, username=request.user.username)
-        shopping_cart = user.shopping_carts.all()
-        shopping_dict = {}
-        for element in shopping_cart:
-            ingredients_queryset = element.recipe.ingredients.all()
-            for ingredient in ingredients_queryset:
-                name = ingredient.ingredient.name
-                amount = ingredient.amount
-                measure = ingredient.ingredient.measurement_unit
-                if name in shopping_dict:
-                    shopping_dict[name]['amount'] = (
-                        shopping_dict[name]['amount'] + amount)
-                else:
-                    shopping_dict[name] = {
-                        'measurement_unit': measure,
-                        'amount': amount}
-        shopping_list = []
-        for index, key in enumerate(shopping_dict, start=1):
-            shopping_list.append(
-                f'{index}. {key} - {shopping_dict[key]["amount"]} '
-                f'{shopping_dict[key]["measurement_unit"]}\n')
-        filename = 'shoppinglist.txt'
-        response = HttpResponse(shopping_list, content_type='text/plain')
-        response['Content-Disposition'] = f'attachment; filename={filename}'
+        file_type = request.query_params.get('filetype', 'txt')
+        if file_type not in RENDERERS:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        render, content_type = RENDERERS[file_type]
+        # Под ASGI Django 3.2 читает потоковый ответ в event loop, где
+        # запросы к базе запрещены, поэтому строки загружаем здесь.
+        rows = list(get_shopping_list(request.user))
+        response = StreamingHttpResponse(
+            render(rows), content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename=shoppinglist.{file_type}'
+        )
         return response
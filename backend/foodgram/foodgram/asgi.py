@@ -0,0 +1,33 @@
+import os
+
+import django
+from asgiref.sync import ThreadSensitiveContext
+from django.core.handlers.asgi import ASGIHandler, ASGIRequest
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+
+django.setup(set_prefix=False)
+
+
+class AsyncViewsRequest(ASGIRequest):
+    # Под ASGI чтение тегов, ингредиентов и рецептов обслуживают
+    # асинхронные представления из api.async_views.
+    urlconf = 'foodgram.asgi_urls'
+
+
+class ThreadPerRequestASGIHandler(ASGIHandler):
+    """ASGIHandler, который дает каждому запросу свой поток.
+
+    Django 3.2 выполняет синхронный код всех запросов в одном общем
+    потоке, и запросы идут строго по очереди. Как и в Django 4.0,
+    отдельный ThreadSensitiveContext на запрос дает ему собственный поток.
+    """
+
+    request_class = AsyncViewsRequest
+
+    async def __call__(self, scope, receive, send):
+        async with ThreadSensitiveContext():
+            await super().__call__(scope, receive, send)
+
+
+application = ThreadPerRequestASGIHandler()
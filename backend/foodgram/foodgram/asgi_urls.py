@@ -0,0 +1,5 @@
+from api.async_views import offload_read_views
+
+from .urls import urlpatterns
+
+urlpatterns = offload_read_views(urlpatterns)
@@ -0,0 +1,89 @@
+import queue
+import threading
+from functools import partial
+
+from django.db.backends.postgresql import base
+from django.db.utils import OperationalError
+from psycopg2 import extensions
+
+Database = base.Database
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """Ограниченный набор соединений, общий для всех потоков процесса."""
+
+    def __init__(self, size, timeout):
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+        self.timeout = timeout
+
+    def acquire(self, connect, is_usable):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise OperationalError('Все соединения пула заняты.')
+        try:
+            while True:
+                try:
+                    connection = self.idle.get_nowait()
+                except queue.Empty:
+                    return connect()
+                if is_usable(connection):
+                    return connection
+                connection.close()
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def release(self, connection):
+        try:
+            if not connection.closed:
+                status = connection.get_transaction_status()
+                if status != extensions.TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+                self.idle.put(connection)
+        except Database.Error:
+            connection.close()
+        finally:
+            self.slots.release()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL, который берет соединения из пула и возвращает их туда."""
+
+    pooled = True
+
+    @property
+    def pool(self):
+        with pools_lock:
+            if self.alias not in pools:
+                pools[self.alias] = ConnectionPool(
+                    self.settings_dict['POOL_SIZE'],
+                    self.settings_dict.get('POOL_TIMEOUT', 5),
+                )
+            return pools[self.alias]
+
+    def get_new_connection(self, conn_params):
+        return self.pool.acquire(
+            partial(super().get_new_connection, conn_params),
+            self.is_pooled_connection_usable,
+        )
+
+    def is_pooled_connection_usable(self, connection):
+        if connection.closed:
+            return False
+        if not self.settings_dict.get('CONN_HEALTH_CHECKS'):
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not connection.autocommit:
+                connection.rollback()
+        except Database.Error:
+            return False
+        return True
+
+    def _close(self):
+        if self.connection is not None:
+            self.pool.release(self.connection)
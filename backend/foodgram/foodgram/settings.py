@@ -25,13 +25,16 @@ INSTALLED_APPS = [
     'djoser',
     'django_filters',
     'users',
-    'api',
-    'recipes',
+    'api.apps.ApiConfig',
+    'recipes.apps.RecipesConfig',
+    'tasks.apps.TasksConfig',
     'colorfield',
     'django.contrib.sites',
 ]
 
 MIDDLEWARE = [
+    'api.profiling.ProfilingMiddleware',
+    'api.databases.DatabaseMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -69,10 +72,57 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='localhost'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_HEALTH_CHECKS',
+                                        default='True') == 'True',
+        'POOL_SIZE': int(os.getenv('DB_POOL_SIZE', default=0)),
+        'POOL_TIMEOUT': int(os.getenv('DB_POOL_TIMEOUT', default=5)),
+    }
+}
+if DATABASES['default']['POOL_SIZE']:
+    DATABASES['default'].update(
+        ENGINE='foodgram.postgresql_pool',
+        CONN_MAX_AGE=0,
+    )
+
+DATABASE_REPLICAS = []
+for index, host in enumerate(
+    filter(None, os.getenv('DB_REPLICA_HOSTS', default='').split(',')),
+    start=1,
+):
+    DATABASES[f'replica{index}'] = {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{index}')
+
+DATABASE_ROUTERS = ['api.databases.ReplicaRouter']
+REPLICA_PIN_TIMEOUT = 10
+
+# Версии кешей и токены сбрасываются в одном процессе, а читаются во
+# всех воркерах, поэтому кеш должен быть общим: по умолчанию файловый,
+# в docker-compose — memcached. Файловый кеш годится только для
+# разработки: каждый set() перечисляет весь каталог, а при превышении
+# MAX_ENTRIES удаляет случайную треть файлов, в том числе ключи версий.
+# Потерянная версия заново создается уникальной, так что устаревшие
+# данные не отдаются, но кеш при этом сбрасывается целиком.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION',
+                              default=os.path.join(BASE_DIR, 'cache')),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
     }
 }
 
+REFERENCE_CACHE_TIMEOUT = 60 * 60 * 24
+RECIPE_CACHE_TIMEOUT = 60 * 60
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.'
@@ -98,10 +148,13 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.'
-                                'PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.PageLimitPagination',
     'PAGE_SIZE': 6,
 }
 
@@ -120,9 +173,53 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+DEFAULT_FILE_STORAGE = 'recipes.storage.ContentAddressedStorage'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+INGREDIENT_SEARCH_BACKEND = os.getenv('INGREDIENT_SEARCH_BACKEND',
+                                      default='memory')
+INGREDIENT_SEARCH_LIMIT = 20
+
+REQUEST_PROFILING = os.getenv('REQUEST_PROFILING', default='False') == 'True'
+REQUEST_PROFILING_DIR = os.getenv('REQUEST_PROFILING_DIR',
+                                  default=os.path.join(BASE_DIR, 'profiling'))
+REQUEST_PROFILING_WINDOW = 60
+REQUEST_PROFILING_FLUSH_EVERY = 100
+REQUEST_PROFILING_FLUSH_INTERVAL = 30
+REQUEST_PROFILING_DUPLICATE_THRESHOLD = 3
+
+BENCH_REPORTS_DIR = os.path.join(BASE_DIR, 'bench')
+
+IMAGE_UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+IMAGE_VARIANTS = {
+    'small': (320, 320),
+    'medium': (800, 800),
+}
+
+FEED_BATCH_SIZE = 1000
+
+RECIPE_STATE_MAX_IDS = 100
+
+RECIPE_SEARCH_CONFIG = os.getenv('RECIPE_SEARCH_CONFIG', default='russian')
+
+AUTH_TOKEN_CACHE_TIMEOUT = 5 * 60
+
+TASKS_EAGER = os.getenv('TASKS_EAGER', default='False') == 'True'
+TASKS_PROCESSES = int(os.getenv('TASKS_PROCESSES', default=2))
+TASKS_MAX_ATTEMPTS = 3
+TASKS_RETRY_DELAY = 10
+TASKS_LEASE = 10 * 60
+TASKS_KEEP_DAYS = 7
+
+# TTF-шрифт с кириллицей для PDF со списком покупок. Встроенные шрифты
+# PDF кириллицу не содержат, поэтому без файла PDF не формируется.
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'HIDE_USERS': False,
@@ -0,0 +1,36 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .models import Ingredient, Recipe
+
+INDEXES = (
+    'CREATE INDEX IF NOT EXISTS recipes_recipe_tags_tag_recipe_idx '
+    'ON recipes_recipe_tags (tag_id, recipe_id)',
+)
+
+POSTGRESQL_INDEXES = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_prefix_idx '
+    'ON recipes_ingredient (UPPER(name::text) text_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_trgm_idx '
+    'ON recipes_ingredient USING gin (UPPER(name::text) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS recipes_recipe_search_idx '
+    'ON recipes_recipe USING gin (search_vector)',
+)
+
+
+def create_indexes(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    connection = connections[using]
+    tables = connection.introspection.table_names()
+    required = (
+        Ingredient._meta.db_table,
+        Recipe._meta.db_table,
+        Recipe.tags.through._meta.db_table,
+    )
+    if not all(table in tables for table in required):
+        return
+    statements = INDEXES
+    if connection.vendor == 'postgresql':
+        statements += POSTGRESQL_INDEXES
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
@@ -0,0 +1,85 @@
+import re
+
+from api.views import RecipeViewSet
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from recipes.models import Recipe, Tag
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from users.models import User
+
+WATCHED_TABLES = (
+    'recipes_recipe',
+    'recipes_recipe_tags',
+    'recipes_favorite',
+    'recipes_shoppingcart',
+    'users_follow',
+)
+SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+def get_combinations(tag, author):
+    return (
+        {},
+        {'tags': tag},
+        {'author': author},
+        {'is_favorited': 1},
+        {'is_in_shopping_cart': 1},
+        {'tags': tag, 'author': author},
+        {'tags': tag, 'is_favorited': 1},
+        {'tags': tag, 'is_in_shopping_cart': 1},
+        {'ordering': '-favorites_count'},
+    )
+
+
+def get_list_queryset(params, user):
+    request = Request(APIRequestFactory().get('/api/recipes/', params))
+    request.user = user
+    view = RecipeViewSet(
+        action='list', request=request, format_kwarg=None, kwargs={}
+    )
+    return view.filter_queryset(view.get_queryset())
+
+
+class Command(BaseCommand):
+    help = ('Проверяет через EXPLAIN, что фильтры ленты рецептов '
+            'не приводят к последовательному сканированию больших таблиц.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=6)
+        parser.add_argument(
+            '--verbose-plans', action='store_true',
+            help='Печатать планы целиком.'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Проверка планов требует PostgreSQL.')
+        tag = Tag.objects.values_list('slug', flat=True).first()
+        author = Recipe.objects.values('author').annotate(
+            total=Count('id')
+        ).order_by('-total').values_list('author', flat=True).first()
+        user = User.objects.annotate(
+            total=Count('favorite_recipes')
+        ).order_by('-total').first()
+        if tag is None or author is None or user is None:
+            raise CommandError('Нет данных: сначала заполните базу.')
+        failures = []
+        for params in get_combinations(tag, author):
+            for current_user in (AnonymousUser(), user):
+                queryset = get_list_queryset(params, current_user)
+                plan = queryset[:options['page_size']].explain()
+                if options['verbose_plans']:
+                    self.stdout.write(f'{params} {current_user}\n{plan}\n')
+                scans = set(SEQ_SCAN.findall(plan)) & set(WATCHED_TABLES)
+                if scans:
+                    failures.append(
+                        f'{params}, {current_user}: {", ".join(sorted(scans))}'
+                    )
+        if failures:
+            raise CommandError(
+                'Последовательное сканирование:\n' + '\n'.join(failures)
+            )
+        self.stdout.write(self.style.SUCCESS('Все планы используют индексы.'))
@@ -0,0 +1,61 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+from recipes.models import ShoppingCart, ShoppingListItem
+
+
+def get_lists(rows):
+    lists = defaultdict(dict)
+    for user_id, ingredient_id, amount in rows.iterator():
+        lists[user_id][ingredient_id] = amount
+    return lists
+
+
+def get_drifted():
+    expected = get_lists(
+        ShoppingCart.objects.order_by().filter(
+            recipe__ingredients__isnull=False
+        ).values_list(
+            'user', 'recipe__ingredients__ingredient'
+        ).annotate(total=Sum('recipe__ingredients__amount'))
+    )
+    actual = get_lists(
+        ShoppingListItem.objects.order_by().values_list(
+            'user', 'ingredient', 'amount'
+        )
+    )
+    return sorted(
+        user_id for user_id in set(expected) | set(actual)
+        if expected.get(user_id) != actual.get(user_id)
+    )
+
+
+class Command(BaseCommand):
+    help = ('Сверяет сохраненные списки покупок с корзинами и '
+            'пересобирает разошедшиеся.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='Пересобрать списки, в которых найдены расхождения.'
+        )
+
+    def handle(self, *args, **options):
+        drifted = get_drifted()
+        self.stdout.write(f'Списков с расхождениями: {len(drifted)}')
+        if not options['fix']:
+            return
+        for user_id in drifted:
+            with transaction.atomic():
+                ShoppingListItem.objects.rebuild(user_id)
+        remaining = get_drifted()
+        if remaining:
+            raise CommandError(
+                f'После пересборки расходятся списки пользователей: '
+                f'{remaining}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересобрано списков: {len(drifted)}'
+        ))
@@ -0,0 +1,66 @@
+import os
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from recipes.models import Recipe
+from recipes.storage import is_content_name
+
+IMAGE_FIELDS = ('image', 'image_small', 'image_medium')
+
+
+def walk(storage, path):
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield os.path.join(path, name).replace(os.sep, '/')
+    for directory in directories:
+        yield from walk(storage, os.path.join(path, directory))
+
+
+def is_referenced(name):
+    return Recipe.objects.filter(
+        Q(image=name) | Q(image_small=name) | Q(image_medium=name)
+    ).exists()
+
+
+class Command(BaseCommand):
+    help = ('Удаляет из хранилища файлы изображений, на которые '
+            'не ссылается ни один рецепт.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=60,
+            help=('Не трогать файлы моложе указанного числа минут: '
+                  'они могут принадлежать незавершенной загрузке.')
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет удалено.'
+        )
+
+    def handle(self, *args, **options):
+        if not default_storage.exists('recipe'):
+            return
+        referenced = set()
+        for names in Recipe.objects.values_list(*IMAGE_FIELDS).iterator():
+            referenced.update(names)
+        threshold = timezone.now() - timedelta(minutes=options['grace'])
+        removed = 0
+        for name in walk(default_storage, 'recipe'):
+            if (not is_content_name(name) or name in referenced
+                    or default_storage.get_modified_time(name) > threshold):
+                continue
+            # Набор ссылок собран в начале обхода, а рецепт мог
+            # сослаться на файл уже после этого.
+            if is_referenced(name):
+                continue
+            removed += 1
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                default_storage.delete(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Неиспользуемых файлов: {removed}'
+        ))
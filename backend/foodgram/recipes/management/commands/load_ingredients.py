@@ -0,0 +1,186 @@
+import csv
+import io
+import json
+import os
+import time
+from itertools import islice
+
+from api.caching import bump_version
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from recipes.models import Ingredient
+
+READ_SIZE = 64 * 1024
+
+
+def get_ingredient(item, where):
+    try:
+        name, measurement_unit = item['name'], item['measurement_unit']
+    except (KeyError, TypeError):
+        raise CommandError(f'{where}: нужны поля name и measurement_unit.')
+    for field, value in (('name', name),
+                         ('measurement_unit', measurement_unit)):
+        max_length = Ingredient._meta.get_field(field).max_length
+        if not isinstance(value, str) or not value.strip():
+            raise CommandError(f'{where}: поле {field} должно быть '
+                               f'непустой строкой.')
+        if len(value) > max_length:
+            raise CommandError(f'{where}: поле {field} длиннее '
+                               f'{max_length} символов.')
+    return name, measurement_unit
+
+
+def get_json_error(decoder, buffer, offset, number):
+    position = len(buffer) - len(buffer.lstrip(' \t\r\n,'))
+    if position == len(buffer):
+        return CommandError(
+            f'Файл оборвался на символе {offset + position}: '
+            f'нет закрывающей скобки массива.'
+        )
+    try:
+        decoder.raw_decode(buffer, position)
+    except ValueError as error:
+        position, reason = error.pos, f': {error.msg}'
+    else:
+        reason = ''
+    return CommandError(
+        f'Некорректный JSON на символе {offset + position} '
+        f'(после записи {number}){reason}.'
+    )
+
+
+def read_json(file):
+    decoder = json.JSONDecoder()
+    buffer = ''
+    offset = 0
+    started = False
+    number = 0
+    for chunk in iter(lambda: file.read(READ_SIZE), ''):
+        buffer += chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != '[':
+                    raise CommandError('Ожидается JSON-массив объектов.')
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except ValueError:
+                # Объект может обрываться на границе куска, дочитываем.
+                break
+            number += 1
+            yield get_ingredient(item, f'Запись {number}')
+        offset += position
+        buffer = buffer[position:]
+    if not started:
+        raise CommandError('Ожидается JSON-массив объектов.')
+    raise get_json_error(decoder, buffer, offset, number)
+
+
+def read_csv(file):
+    reader = csv.reader(file)
+    for row in reader:
+        if not row:
+            continue
+        where = f'Строка {reader.line_num}'
+        if len(row) < 2:
+            raise CommandError(f'{where}: ожидаются два столбца, '
+                               f'name и measurement_unit.')
+        yield get_ingredient(
+            {'name': row[0], 'measurement_unit': row[1]}, where
+        )
+
+
+READERS = {
+    '.json': read_json,
+    '.csv': read_csv,
+}
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    batch = list(islice(rows, size))
+    while batch:
+        yield batch
+        batch = list(islice(rows, size))
+
+
+def load_with_bulk_create(batch):
+    Ingredient.objects.bulk_create(
+        (Ingredient(name=name, measurement_unit=measurement_unit)
+         for name, measurement_unit in batch),
+        ignore_conflicts=True,
+    )
+
+
+def load_with_copy(batch):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(batch)
+    buffer.seek(0)
+    table = Ingredient._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMP TABLE IF NOT EXISTS ingredient_import '
+            '(name text, measurement_unit text) ON COMMIT DELETE ROWS'
+        )
+        cursor.copy_expert(
+            'COPY ingredient_import (name, measurement_unit) '
+            'FROM STDIN WITH CSV', buffer
+        )
+        cursor.execute(
+            f'INSERT INTO {table} (name, measurement_unit) '
+            'SELECT DISTINCT name, measurement_unit FROM ingredient_import '
+            'ON CONFLICT DO NOTHING'
+        )
+        cursor.execute('TRUNCATE ingredient_import')
+
+
+class Command(BaseCommand):
+    help = 'Загружает ингредиенты из JSON- или CSV-файла.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=os.path.join(
+                settings.BASE_DIR, 'static', 'data', 'ingredients.json'
+            ),
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--copy', action='store_true',
+            help='Загружать через COPY (только PostgreSQL).'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        load = load_with_bulk_create
+        if options['copy']:
+            if connection.vendor != 'postgresql':
+                raise CommandError('COPY доступен только для PostgreSQL.')
+            load = load_with_copy
+        count_before = Ingredient.objects.count()
+        processed = 0
+        started = time.monotonic()
+        with open(path, encoding='utf-8', newline='') as file:
+            for batch in batches(READERS[extension](file),
+                                 options['batch_size']):
+                with transaction.atomic():
+                    load(batch)
+                processed += len(batch)
+        elapsed = time.monotonic() - started
+        created = Ingredient.objects.count() - count_before
+        bump_version('ingredients')
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано строк: {processed}, добавлено: {created}, '
+            f'{processed / max(elapsed, 1e-6):.0f} строк/с.'
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import connections, router, transaction
+from recipes.models import FeedEntry, Recipe
+from users.models import Follow
+
+
+class Command(BaseCommand):
+    help = ('Заполняет ленту подписок по текущим подпискам. Нужна после '
+            'массовой загрузки данных в обход API.')
+
+    def handle(self, *args, **options):
+        using = router.db_for_write(FeedEntry)
+        ops = connections[using].ops
+        table = ops.quote_name
+        sql = (
+            f'{ops.insert_statement(ignore_conflicts=True)} '
+            f'{table(FeedEntry._meta.db_table)} '
+            f'(user_id, recipe_id, author_id) '
+            f'SELECT follow.user_id, recipe.id, recipe.author_id '
+            f'FROM {table(Follow._meta.db_table)} follow '
+            f'INNER JOIN {table(Recipe._meta.db_table)} recipe '
+            f'ON recipe.author_id = follow.author_id '
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}'
+        )
+        with transaction.atomic(using=using):
+            with connections[using].cursor() as cursor:
+                cursor.execute(sql)
+                added = cursor.rowcount
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено записей в ленту: {added}'
+        ))
@@ -0,0 +1,12 @@
+from api.recipe_search import update_search_vectors
+from django.core.management.base import BaseCommand
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает поисковые векторы всех рецептов. Нужна после '
+            'массовой загрузки данных в обход API.')
+
+    def handle(self, *args, **options):
+        update_search_vectors(Recipe.objects.all())
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс обновлен'))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+
+def count_subquery(model):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(recipe=OuterRef('pk')).order_by().values(
+                'recipe'
+            ).annotate(count=Count('id')).values('count'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счетчики избранного и списков покупок '
+            'у рецептов, где они разошлись с данными.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать количество расхождений.'
+        )
+
+    def handle(self, *args, **options):
+        drifted = Recipe.objects.annotate(
+            actual_favorites=count_subquery(Favorite),
+            actual_shopping_carts=count_subquery(ShoppingCart),
+        ).filter(
+            ~Q(favorites_count=F('actual_favorites'))
+            | ~Q(shopping_carts_count=F('actual_shopping_carts'))
+        )
+        if options['dry_run']:
+            self.stdout.write(f'Рецептов с расхождениями: {drifted.count()}')
+            return
+        updated = Recipe.objects.filter(
+            pk__in=drifted.values('pk')
+        ).update(
+            favorites_count=count_subquery(Favorite),
+            shopping_carts_count=count_subquery(ShoppingCart),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено рецептов: {updated}'
+        ))
@@ -0,0 +1,152 @@
+import random
+import time
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCart, Tag)
+from users.models import Follow, User
+
+TAG_COLORS = ('#E26C2D', '#49B64E', '#8775D2', '#F5C518', '#2D9CDB')
+
+
+def chunked(items, size):
+    items = iter(items)
+    chunk = list(islice(items, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(items, size))
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими данными для нагрузочных тестов. '
+            'При одинаковом --seed данные получаются одинаковыми.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--follows-per-user', type=int, default=20)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--tags', type=int, default=5)
+        parser.add_argument('--tags-per-recipe', type=int, default=2)
+        parser.add_argument('--ingredients', type=int, default=500)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--favorites-per-user', type=int, default=30)
+        parser.add_argument('--carts-per-user', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.prefix = f'bench{options["seed"]}'
+        started = time.monotonic()
+        users = self.create_users(options['users'])
+        tags = self.create_tags(options['tags'])
+        ingredients = self.create_ingredients(options['ingredients'])
+        self.create_follows(users, options['follows_per_user'])
+        recipes = self.create_recipes(users, options['recipes'])
+        self.link(
+            Recipe.tags.through, 'tag_id', recipes, tags,
+            options['tags_per_recipe'],
+        )
+        self.link(
+            IngredientRecipe, 'ingredient_id', recipes, ingredients,
+            options['ingredients_per_recipe'],
+            lambda: {'amount': self.rng.randint(1, 500)},
+        )
+        for model, per_user in ((Favorite, options['favorites_per_user']),
+                                (ShoppingCart, options['carts_per_user'])):
+            self.bulk_create(
+                model(user_id=user, recipe_id=recipe)
+                for user in users
+                for recipe in self.sample(recipes, per_user)
+            )
+        call_command('reconcile_counters', stdout=self.stdout)
+        call_command('rebuild_feed', stdout=self.stdout)
+        call_command('rebuild_search', stdout=self.stdout)
+        call_command('check_shopping_lists', fix=True, stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с.'
+        ))
+
+    def sample(self, population, count):
+        return self.rng.sample(population, min(count, len(population)))
+
+    def bulk_create(self, objects):
+        for batch in chunked(objects, self.batch_size):
+            type(batch[0]).objects.bulk_create(batch, ignore_conflicts=True)
+
+    def create_users(self, count):
+        password = make_password(self.prefix)
+        self.bulk_create(
+            User(username=f'{self.prefix}-user-{number}',
+                 email=f'{self.prefix}-user-{number}@example.com',
+                 first_name='Bench', last_name=str(number),
+                 password=password)
+            for number in range(count)
+        )
+        return list(User.objects.filter(
+            username__startswith=f'{self.prefix}-user-'
+        ).order_by('id').values_list('id', flat=True))
+
+    def create_tags(self, count):
+        self.bulk_create(
+            Tag(name=f'{self.prefix}-tag-{number}',
+                slug=f'{self.prefix}-tag-{number}',
+                color=f'#{self.rng.randrange(0x1000000):06X}')
+            for number in range(count)
+        )
+        return list(Tag.objects.filter(
+            slug__startswith=f'{self.prefix}-tag-'
+        ).order_by('id').values_list('id', flat=True))
+
+    def create_ingredients(self, count):
+        ingredients = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)
+        )
+        if len(ingredients) >= count:
+            return ingredients
+        self.bulk_create(
+            Ingredient(name=f'{self.prefix} ингредиент {number}',
+                       measurement_unit='г')
+            for number in range(count - len(ingredients))
+        )
+        return list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)
+        )
+
+    def create_follows(self, users, per_user):
+        self.bulk_create(
+            Follow(user_id=user, author_id=author)
+            for user in users
+            for author in self.sample(users, per_user)
+            if author != user
+        )
+
+    def create_recipes(self, users, count):
+        name = f'{self.prefix}-recipe-'
+        existing = Recipe.objects.filter(name__startswith=name).count()
+        self.bulk_create(
+            Recipe(author_id=self.rng.choice(users),
+                   name=f'{name}{number}',
+                   image='recipe/bench.png',
+                   text=f'Описание рецепта {number}. ' * 10,
+                   cooking_time=self.rng.randint(1, 180))
+            for number in range(existing, count)
+        )
+        return list(Recipe.objects.filter(
+            name__startswith=name
+        ).order_by('id').values_list('id', flat=True))
+
+    def link(self, model, field, recipes, targets, per_recipe, extra=dict):
+        linked = set(model.objects.filter(
+            recipe__name__startswith=f'{self.prefix}-recipe-'
+        ).values_list('recipe_id', flat=True).distinct())
+        self.bulk_create(
+            model(recipe_id=recipe, **{field: target}, **extra())
+            for recipe in recipes
+            if recipe not in linked
+            for target in self.sample(targets, per_recipe)
+        )
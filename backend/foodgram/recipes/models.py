@@ -1,6 +1,9 @@
 from colorfield.fields import ColorField
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connections, models, router
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.utils import timezone
 from users.models import User
 
 
@@ -26,6 +29,12 @@ class Ingredient(models.Model):
         ordering = ('-name', )
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient'
+            )
+        ]
 
     def __str__(self):
         return self.name
@@ -41,16 +50,44 @@ class Recipe(models.Model):
     tags = models.ManyToManyField(Tag, verbose_name='Тег')
     name = models.CharField('Имя', max_length=200, unique=True)
     image = models.ImageField('Изображение', upload_to='recipe/')
+    image_small = models.ImageField(
+        'Миниатюра', upload_to='recipe/variants/', blank=True, editable=False
+    )
+    image_medium = models.ImageField(
+        'Уменьшенное изображение', upload_to='recipe/variants/', blank=True,
+        editable=False
+    )
     text = models.TextField('Описание')
     cooking_time = models.PositiveIntegerField(
         'Время приготовления',
         validators=[MinValueValidator(limit_value=1,
                     message="Введите число больше единицы")])
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное', default=0, editable=False
+    )
+    shopping_carts_count = models.PositiveIntegerField(
+        'Добавлений в список покупок', default=0, editable=False
+    )
+    search_vector = SearchVectorField(null=True, editable=False)
+    updated_at = models.DateTimeField(
+        'Изменен', default=timezone.now, editable=False
+    )
 
     class Meta():
         ordering = ['-id']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(fields=('author', '-id'), name='recipe_author_idx'),
+            models.Index(fields=('-favorites_count', '-id'),
+                         name='recipe_favorites_count_idx'),
+            models.Index(fields=('-shopping_carts_count', '-id'),
+                         name='recipe_carts_count_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.updated_at = timezone.now()
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -76,6 +113,69 @@ class IngredientRecipe(models.Model):
         return f"Ингредиент: {self.ingredient}, Рецепт: {self.recipe}"
 
 
+class UserRecipeQuerySet(models.QuerySet):
+    def add(self, user, recipe):
+        connection = connections[router.db_for_write(self.model)]
+        ops = connection.ops
+        meta = self.model._meta
+        columns = ', '.join(
+            ops.quote_name(meta.get_field(name).column)
+            for name in ('user', 'recipe')
+        )
+        sql = (
+            f'{ops.insert_statement(ignore_conflicts=True)} '
+            f'{ops.quote_name(meta.db_table)} ({columns}) VALUES (%s, %s) '
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, (user.pk, recipe.pk))
+            return cursor.rowcount == 1
+
+    def remove(self, user, recipe_id):
+        return self.filter(user=user, recipe_id=recipe_id).delete()[0] > 0
+
+    def execute_returning_recipes(self, sql, params):
+        connection = connections[router.db_for_write(self.model)]
+        column = connection.ops.quote_name(
+            self.model._meta.get_field('recipe').column
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'{sql} RETURNING {column}', params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def add_many(self, user, recipe_ids):
+        if not recipe_ids:
+            return []
+        ops = connections[router.db_for_write(self.model)].ops
+        meta = self.model._meta
+        columns = ', '.join(
+            ops.quote_name(meta.get_field(name).column)
+            for name in ('user', 'recipe')
+        )
+        values = ', '.join(['(%s, %s)'] * len(recipe_ids))
+        return self.execute_returning_recipes(
+            f'{ops.insert_statement(ignore_conflicts=True)} '
+            f'{ops.quote_name(meta.db_table)} ({columns}) VALUES {values} '
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}',
+            [value for recipe_id in recipe_ids
+             for value in (user.pk, recipe_id)]
+        )
+
+    def remove_many(self, user, recipe_ids):
+        if not recipe_ids:
+            return []
+        ops = connections[router.db_for_write(self.model)].ops
+        meta = self.model._meta
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        return self.execute_returning_recipes(
+            f'DELETE FROM {ops.quote_name(meta.db_table)} '
+            f'WHERE {ops.quote_name(meta.get_field("user").column)} = %s '
+            f'AND {ops.quote_name(meta.get_field("recipe").column)} '
+            f'IN ({placeholders})',
+            [user.pk, *recipe_ids]
+        )
+
+
 class Favorite(models.Model):
     user = models.ForeignKey(User,
                              on_delete=models.CASCADE,
@@ -86,9 +186,17 @@ class Favorite(models.Model):
                                related_name="favorites",
                                verbose_name='Рецепт')
 
+    objects = UserRecipeQuerySet.as_manager()
+
     class Meta():
         ordering = ['-id']
         verbose_name = 'Избранный рецепт'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_favorite'
+            )
+        ]
 
     def __str__(self):
         return f'избранное пользователя {self.user}'
@@ -104,12 +212,140 @@ class ShoppingCart(models.Model):
                                related_name='shopping_carts',
                                verbose_name='Рецепт')
 
+    objects = UserRecipeQuerySet.as_manager()
+
     class Meta():
         ordering = ['-id']
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
-        models.UniqueConstraint(
-            fields=['user', 'recipe'], name='unique_recording')
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_recording'
+            )
+        ]
 
     def __str__(self):
         return f'список покупок пользователя {self.user}'
+
+
+class ShoppingListQuerySet(models.QuerySet):
+    def insert_from_carts(self, condition, params):
+        connection = connections[router.db_for_write(self.model)]
+        quote_name = connection.ops.quote_name
+        table = quote_name(self.model._meta.db_table)
+        sql = (
+            f'INSERT INTO {table} (user_id, ingredient_id, amount) '
+            f'SELECT cart.user_id, item.ingredient_id, SUM(item.amount) '
+            f'FROM {quote_name(ShoppingCart._meta.db_table)} cart '
+            f'INNER JOIN {quote_name(IngredientRecipe._meta.db_table)} item '
+            f'ON item.recipe_id = cart.recipe_id '
+            f'WHERE {condition} '
+            f'GROUP BY cart.user_id, item.ingredient_id '
+            f'ON CONFLICT (user_id, ingredient_id) '
+            f'DO UPDATE SET amount = {table}.amount + EXCLUDED.amount'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def add_recipe(self, recipe_id, user=None):
+        self.add_recipes([recipe_id], user)
+
+    def add_recipes(self, recipe_ids, user=None):
+        if not recipe_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        condition = f'cart.recipe_id IN ({placeholders})'
+        params = list(recipe_ids)
+        if user is not None:
+            condition += ' AND cart.user_id = %s'
+            params.append(user.pk)
+        self.insert_from_carts(condition, params)
+
+    def subtract(self, items, recipe_ids):
+        items = items.filter(ingredient__in=IngredientRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values('ingredient'))
+        items.update(amount=F('amount') - Subquery(
+            IngredientRecipe.objects.filter(
+                recipe_id__in=recipe_ids, ingredient=OuterRef('ingredient')
+            ).order_by().values('ingredient').annotate(
+                total=Sum('amount')
+            ).values('total')
+        ))
+        items.filter(amount__lte=0).delete()
+
+    def remove_recipe(self, recipe_id, user=None):
+        if user is None:
+            self.subtract(self.filter(user__in=ShoppingCart.objects.filter(
+                recipe_id=recipe_id
+            ).values('user')), [recipe_id])
+        else:
+            self.remove_recipes([recipe_id], user)
+
+    def remove_recipes(self, recipe_ids, user):
+        if recipe_ids:
+            self.subtract(self.filter(user=user), recipe_ids)
+
+    def rebuild(self, user_id):
+        self.filter(user_id=user_id).delete()
+        self.insert_from_carts('cart.user_id = %s', (user_id,))
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='shopping_list',
+                             verbose_name='Пользователь')
+    ingredient = models.ForeignKey(Ingredient,
+                                   on_delete=models.CASCADE,
+                                   related_name='+',
+                                   verbose_name='Ингредиент')
+    amount = models.IntegerField('Количество')
+
+    objects = ShoppingListQuerySet.as_manager()
+
+    class Meta():
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Итоговые списки покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient} в списке покупок {self.user}'
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='feed_entries',
+                             verbose_name='Подписчик')
+    recipe = models.ForeignKey(Recipe,
+                               on_delete=models.CASCADE,
+                               related_name='feed_entries',
+                               verbose_name='Рецепт')
+    author = models.ForeignKey(User,
+                               on_delete=models.CASCADE,
+                               related_name='+',
+                               verbose_name='Автор')
+
+    class Meta():
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(fields=('user', 'author'),
+                         name='feed_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} в ленте пользователя {self.user}'
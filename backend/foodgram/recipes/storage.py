@@ -0,0 +1,49 @@
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.views.static import serve
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+CONTENT_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{64}\.\w+$')
+
+
+def is_content_name(name):
+    return CONTENT_NAME.search(name) is not None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файл один раз под sha256 его содержимого."""
+
+    def get_content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            os.path.dirname(name), digest[:2], digest + extension
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_content_name(name, content)
+        if self.exists(name):
+            # Свежая дата изменения защищает файл от collect_media,
+            # пока новая ссылка на него еще не сохранена.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
+
+
+def serve_media(request, path, document_root=None):
+    response = serve(request, path, document_root)
+    if is_content_name(path):
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
@@ -0,0 +1,16 @@
+from django.contrib import admin
+
+from .models import Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'duration',
+                    'created_at', 'finished_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('name', 'arguments')
+
+    def has_add_permission(self, request):
+        # Задачи ставит только код: имя и аргументы из админки позволили
+        # бы воркеру вызвать что угодно.
+        return False
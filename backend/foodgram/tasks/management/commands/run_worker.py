@@ -0,0 +1,65 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, Max, Q
+from tasks.models import Task
+from tasks.worker import Worker
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди в базе данных.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=settings.TASKS_PROCESSES,
+            help='Число процессов, выполняющих задачи.'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Как часто, в секундах, проверять очередь.'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи и завершиться.'
+        )
+        parser.add_argument(
+            '--stats', action='store_true',
+            help='Показать время выполнения задач по функциям и выйти.'
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.print_stats()
+            return
+        worker = Worker(options['processes'], options['poll_interval'])
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        self.stdout.write(
+            f'Воркер запущен, процессов: {options["processes"]}'
+        )
+        worker.run(once=options['once'])
+
+    def print_stats(self):
+        rows = (
+            Task.objects
+            .values('name')
+            .annotate(
+                count=Count('id'),
+                pending=Count('id', filter=Q(status=Task.PENDING)),
+                failed=Count('id', filter=Q(status=Task.FAILED)),
+                avg=Avg('duration', filter=Q(status=Task.DONE)),
+                max=Max('duration', filter=Q(status=Task.DONE)),
+            )
+            .order_by('name')
+        )
+        self.stdout.write(
+            f'{"задача":<50} {"всего":>7} {"ждут":>7} {"ошибок":>7} '
+            f'{"сред, мс":>10} {"макс, мс":>10}'
+        )
+        for row in rows:
+            self.stdout.write(
+                f'{row["name"]:<50} {row["count"]:>7} {row["pending"]:>7} '
+                f'{row["failed"]:>7} {row["avg"] or 0:>10.1f} '
+                f'{row["max"] or 0:>10.1f}'
+            )
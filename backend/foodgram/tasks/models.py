@@ -0,0 +1,47 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Task(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    name = models.CharField('Функция', max_length=255)
+    arguments = models.TextField('Аргументы (JSON)', default='[]')
+    status = models.CharField(
+        'Статус',
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING
+    )
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveSmallIntegerField('Максимум попыток',
+                                                    default=3)
+    run_after = models.DateTimeField('Выполнить после', default=timezone.now)
+    locked_until = models.DateTimeField('Занята до', null=True, blank=True)
+    created_at = models.DateTimeField('Создана', default=timezone.now,
+                                      editable=False)
+    started_at = models.DateTimeField('Начата', null=True, blank=True)
+    finished_at = models.DateTimeField('Завершена', null=True, blank=True)
+    duration = models.FloatField('Длительность, мс', null=True, blank=True)
+    error = models.TextField('Ошибка', blank=True)
+
+    class Meta:
+        ordering = ('-id',)
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = [
+            models.Index(fields=('status', 'run_after'),
+                         name='task_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.get_status_display()})'
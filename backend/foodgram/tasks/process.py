@@ -0,0 +1,49 @@
+import json
+import time
+import traceback
+
+import django
+from django.db import close_old_connections
+
+# Модуль загружается в дочерних процессах до django.setup(), поэтому
+# модели здесь импортировать нельзя.
+
+registry = {}
+
+
+def get_task_name(function):
+    return f'{function.__module__}.{function.__qualname__}'
+
+
+def register(function):
+    """Разрешает ставить function в очередь.
+
+    Воркер вызывает только зарегистрированные функции: имя задачи берется
+    из базы, и импортировать по нему что угодно нельзя. Модули с задачами
+    должны загружаться в ready() своего приложения.
+    """
+    registry[get_task_name(function)] = function
+    return function
+
+
+def setup():
+    django.setup()
+
+
+def call(name, arguments):
+    started = time.perf_counter()
+    error = ''
+    try:
+        if name not in registry:
+            raise LookupError(f'Задача {name} не зарегистрирована.')
+        registry[name](*json.loads(arguments))
+    except Exception:
+        error = traceback.format_exc()
+    return (time.perf_counter() - started) * 1000, error
+
+
+def execute(name, arguments):
+    try:
+        return call(name, arguments)
+    finally:
+        close_old_connections()
@@ -0,0 +1,38 @@
+import json
+import logging
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Task
+from .process import call, get_task_name, registry
+
+logger = logging.getLogger(__name__)
+
+
+def run_eagerly(name, arguments):
+    _, error = call(name, arguments)
+    if error:
+        logger.error('Задача %s завершилась с ошибкой:\n%s', name, error)
+
+
+def enqueue(function, *args):
+    """Ставит вызов function(*args) в очередь run_worker.
+
+    Задача сохраняется в той же транзакции, что и данные, поэтому
+    воркер не увидит ее раньше коммита. Аргументы должны сериализоваться
+    в JSON, а сама функция — быть помечена декоратором register и
+    спокойно переживать повторный запуск.
+    """
+    name = get_task_name(function)
+    if name not in registry:
+        raise ValueError(f'Функция {name} не зарегистрирована как задача.')
+    arguments = json.dumps(args)
+    if settings.TASKS_EAGER:
+        transaction.on_commit(lambda: run_eagerly(name, arguments))
+        return None
+    return Task.objects.create(
+        name=name,
+        arguments=arguments,
+        max_attempts=settings.TASKS_MAX_ATTEMPTS,
+    )
@@ -0,0 +1,155 @@
+import logging
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+from .process import execute, setup
+
+logger = logging.getLogger(__name__)
+
+
+def expire_stale():
+    """Отмечает ошибкой задачи, которые исчерпали попытки и зависли."""
+    return Task.objects.filter(
+        status=Task.RUNNING,
+        locked_until__lt=timezone.now(),
+        attempts__gte=F('max_attempts'),
+    ).update(
+        status=Task.FAILED,
+        locked_until=None,
+        error='Истекло время выполнения.',
+    )
+
+
+def claim(limit):
+    """Забирает до limit готовых задач, включая брошенные упавшим воркером.
+
+    На PostgreSQL параллельные воркеры пропускают чужие строки благодаря
+    SKIP LOCKED, так что одну задачу не получат двое.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Task.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                Q(status=Task.PENDING, run_after__lte=now)
+                | Q(status=Task.RUNNING, locked_until__lt=now,
+                    attempts__lt=F('max_attempts'))
+            )
+            .order_by('run_after')
+            .values_list('id', flat=True)[:limit]
+        )
+        Task.objects.filter(id__in=ids).update(
+            status=Task.RUNNING,
+            attempts=F('attempts') + 1,
+            started_at=now,
+            locked_until=now + timedelta(seconds=settings.TASKS_LEASE),
+        )
+    return list(Task.objects.filter(id__in=ids).order_by('run_after'))
+
+
+def finish(task, duration, error):
+    now = timezone.now()
+    values = {
+        'duration': duration,
+        'error': error,
+        'finished_at': now,
+        'locked_until': None,
+        'status': Task.DONE,
+    }
+    if error and task.attempts < task.max_attempts:
+        delay = settings.TASKS_RETRY_DELAY * 2 ** (task.attempts - 1)
+        values.update(status=Task.PENDING, finished_at=None,
+                      run_after=now + timedelta(seconds=delay))
+        logger.warning('Задача %s #%s упала, повтор через %s с',
+                       task.name, task.pk, delay)
+    elif error:
+        values['status'] = Task.FAILED
+        logger.error('Задача %s #%s упала после %s попыток:\n%s',
+                     task.name, task.pk, task.attempts, error)
+    else:
+        logger.info('Задача %s #%s выполнена за %.1f мс',
+                    task.name, task.pk, duration)
+    Task.objects.filter(pk=task.pk).update(**values)
+
+
+def purge_finished():
+    threshold = timezone.now() - timedelta(days=settings.TASKS_KEEP_DAYS)
+    return Task.objects.filter(
+        status__in=(Task.DONE, Task.FAILED), finished_at__lt=threshold
+    ).delete()[0]
+
+
+class Worker:
+    """Выполняет задачи из очереди в пуле процессов.
+
+    Родительский процесс только забирает задачи и записывает результат,
+    сами функции работают в дочерних процессах с собственными
+    соединениями к базе.
+    """
+
+    def __init__(self, processes, poll_interval):
+        self.processes = processes
+        self.poll_interval = poll_interval
+        self.stopped = False
+        self.purged_at = 0
+
+    def stop(self, *args):
+        self.stopped = True
+
+    def create_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=setup,
+        )
+
+    def run(self, once=False):
+        while not self.stopped:
+            with self.create_executor() as executor:
+                try:
+                    self.process(executor, once)
+                except BrokenProcessPool:
+                    # Задачи упавшего процесса вернутся в очередь,
+                    # когда истечет TASKS_LEASE.
+                    logger.exception('Пул процессов сломан, пересоздаем')
+                    continue
+            return
+
+    def process(self, executor, once):
+        running = {}
+        while running or not self.stopped:
+            if not self.stopped and len(running) < self.processes:
+                expire_stale()
+                for task in claim(self.processes - len(running)):
+                    future = executor.submit(execute, task.name,
+                                             task.arguments)
+                    running[future] = task
+                close_old_connections()
+            if not running:
+                if once:
+                    return
+                self.purge()
+                time.sleep(self.poll_interval)
+                continue
+            done, _ = wait(running, timeout=self.poll_interval,
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                finish(running.pop(future), *future.result())
+
+    def purge(self):
+        if time.monotonic() - self.purged_at < 60 * 60:
+            return
+        self.purged_at = time.monotonic()
+        purged = purge_finished()
+        if purged:
+            logger.info('Удалено завершенных задач: %s', purged)